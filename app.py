@@ -1,49 +1,99 @@
 
 
 
+import time
+startup_start = time.perf_counter()  # For the startup-time measurement
+
 import tkinter as tk
-from tkinter import filedialog, Label, Entry, Button
+from tkinter import filedialog, messagebox, Label, Entry, Button
 import cv2
-import torch
-from ultralytics import YOLO
-from PIL import Image, ImageTk
 import os
-
-# Load the trained YOLOv8 model
-model = YOLO('best_model_v7.pt')  # Load your trained model
-
-# Create a directory to save the frames if it doesn't exist
+from capture import open_capture
+from detection_store import DetectionStore
+from gif_player import GifPlayer
+from metrics import metrics, serve_metrics
+from model_loader import get_model_handle
+from motion import load_motion_settings, motion_gate_for
+from video_writer import SegmentedVideoWriter, segment_prefix
+from roi import load_roi_settings, region_inference_for
+from postprocess import annotate, extract_detections
+
+# Inference backend: 'torch', or 'onnx'/'openvino' to run an exported copy on CPU
+model_backend = 'torch'
+model_threads = None  # Inference threads; None keeps the runtime default
+model_imgsz = 640  # Model input size
+
+# Load the trained YOLOv8 model on a background thread (exported and warmed up once for the
+# chosen backend); the window is usable right away and inference waits until it is ready
+model = get_model_handle('best_model_v7.pt', backend=model_backend, threads=model_threads, imgsz=model_imgsz)
+
+# Create a directory to save the annotated video segments if it doesn't exist
 output_dir = 'tested'
 if not os.path.exists(output_dir):
     os.makedirs(output_dir)
 
+# Only write frames that have detections
+detections_only = False
+
+# Every frame's detections are also stored here for querying (see detection_store.py)
+detection_db = os.path.join(output_dir, 'detections.db')
+
+# Serve Prometheus metrics at http://127.0.0.1:<port>/metrics; None leaves instrumentation off
+metrics_port = None
+
+# Optional per-camera motion gating (see motion.json)
+motion_settings = load_motion_settings()
+
+# Optional per-camera regions of interest and tiling (see roi.json)
+roi_settings = load_roi_settings()
+
 def upload_file():
     # Open file dialog to upload a video or GIF
     file_path = filedialog.askopenfilename(filetypes=[("Video/GIF files", "*.mp4;*.avi;*.gif")])
     if file_path:
+        process_video(file_path)  # GIFs go through the same detection as videos
         if file_path.lower().endswith('.gif'):
             display_gif(file_path)
-        else:
-            process_video(file_path)
 
 def process_video(video_source):
-    cap = cv2.VideoCapture(video_source)
+    cap = open_capture(video_source)
+    if not cap.isOpened():
+        messagebox.showerror("Error", f"Unable to open video source: {video_source}")
+        return
+    stream_name = segment_prefix(video_source)
+    # Annotated frames are encoded into rotating segments on a background thread
+    writer = SegmentedVideoWriter(output_dir, prefix=stream_name, fps=cap.get(cv2.CAP_PROP_FPS),
+                                  detections_only=detections_only)
+    store = DetectionStore(detection_db)
+    motion_gate = motion_gate_for(video_source, motion_settings)
+    regions = region_inference_for(video_source, roi_settings)
     frame_count = 0
     
     while True:
-        ret, frame = cap.read()
+        with metrics.timer('decode', stream_name):
+            ret, frame = cap.read()
         if not ret:
             break
         
-        # Make predictions using the YOLO model
-        results = model(frame)
+        # Make predictions using the YOLO model, unless the scene is static
+        ran_model = motion_gate is None or motion_gate.should_infer(frame)
+        if ran_model:
+            with metrics.timer('infer', stream_name):
+                if regions is not None:
+                    # Only the regions of interest go through the model, in one batch
+                    detections = regions.detect(model, frame)
+                else:
+                    results = model(frame)
+                    detections = extract_detections(results[0])
         
-        # Draw the detections on the frame
-        annotated_frame = results[0].plot()
+        # Draw the detections on the frame (the last ones are reused on skipped frames)
+        annotated_frame = annotate(frame, detections, model.names)
 
         # Save the frame with detections
-        frame_filename = os.path.join(output_dir, f"frame_{frame_count:04d}.jpg")
-        cv2.imwrite(frame_filename, annotated_frame)
+        with metrics.timer('write', stream_name):
+            writer.write(annotated_frame, frame_count, has_detections=len(detections) > 0)
+        if ran_model:
+            store.add(str(video_source), frame_count, detections, model.names)
 
         # Display the frame with detections
         cv2.imshow("Detections", annotated_frame)
@@ -52,10 +102,20 @@ def process_video(video_source):
             break
         
         frame_count += 1
+        metrics.frame_done(stream_name)
 
     cap.release()
+    writer.close()
+    store.close()
     cv2.destroyAllWindows()
 
+def poll_model():
+    status_label.configure(text=model.status())
+    if not model.loaded.is_set():
+        root.after(200, poll_model)
+    elif model.error is None:
+        print(f"Model ready {time.perf_counter() - startup_start:.2f}s after startup")
+
 def process_rtsp():
     rtsp_url = rtsp_entry.get()
     if rtsp_url:
@@ -66,52 +126,53 @@ def display_gif(gif_path):
     gif_window.title("GIF Viewer")
     gif_window.geometry("600x400")
 
-    # Load the GIF using PIL
-    gif_image = Image.open(gif_path)
-    frames = []
-
-    try:
-        while True:
-            frame = ImageTk.PhotoImage(gif_image.copy())
-            frames.append(frame)
-            gif_image.seek(len(frames))  # Load next frame
-    except EOFError:
-        pass
-
     # Label to display GIF frames
     gif_label = Label(gif_window)
     gif_label.pack(fill="both", expand=True)
 
-    def update_gif(index):
-        frame = frames[index]
-        gif_label.configure(image=frame)
-        index = (index + 1) % len(frames)
-        gif_window.after(100, update_gif, index)  # 100 ms delay between frames
+    # Frames are decoded on demand and shown for their own duration
+    player = GifPlayer(gif_label, gif_path, size=(600, 400))
+
+    def close_gif():
+        player.stop()
+        gif_window.destroy()
+
+    gif_window.protocol("WM_DELETE_WINDOW", close_gif)
+    player.start()  # Start displaying the first frame
+
+if __name__ == '__main__':
+    if metrics_port is not None:
+        metrics.enabled = True
+        serve_metrics(metrics, metrics_port)
 
-    update_gif(0)  # Start displaying the first frame
+    # Create the GUI
+    root = tk.Tk()
+    root.title("Shoplift Detection")
+    root.geometry("800x600")  # Set the initial size of the window
+    root.configure(bg="#f0f0f0")  # Set a background color
 
-# Create the GUI
-root = tk.Tk()
-root.title("Shoplift Detection")
-root.geometry("800x600")  # Set the initial size of the window
-root.configure(bg="#f0f0f0")  # Set a background color
+    # Header
+    header = tk.Label(root, text="Shoplift Detection System", font=("Helvetica", 24, "bold"), bg="#4CAF50", fg="white", pady=10)
+    header.pack(fill="x")
 
-# Header
-header = tk.Label(root, text="Shoplift Detection System", font=("Helvetica", 24, "bold"), bg="#4CAF50", fg="white", pady=10)
-header.pack(fill="x")
+    # Model loading state
+    status_label = Label(root, text=model.status(), font=("Helvetica", 12), bg="#f0f0f0")
+    status_label.pack()
+    poll_model()
 
-# RTSP URL Entry
-rtsp_label = Label(root, text="RTSP Stream URL:", font=("Helvetica", 14), bg="#f0f0f0")
-rtsp_label.pack(pady=10)
-rtsp_entry = Entry(root, width=60, font=("Helvetica", 12))
-rtsp_entry.pack(pady=5)
+    # RTSP URL Entry
+    rtsp_label = Label(root, text="RTSP Stream URL:", font=("Helvetica", 14), bg="#f0f0f0")
+    rtsp_label.pack(pady=10)
+    rtsp_entry = Entry(root, width=60, font=("Helvetica", 12))
+    rtsp_entry.pack(pady=5)
 
-# Button to start RTSP stream detection
-rtsp_button = Button(root, text="Start RTSP Stream", command=process_rtsp, font=("Helvetica", 12), bg="#4CAF50", fg="white", padx=10, pady=5)
-rtsp_button.pack(pady=10)
+    # Button to start RTSP stream detection
+    rtsp_button = Button(root, text="Start RTSP Stream", command=process_rtsp, font=("Helvetica", 12), bg="#4CAF50", fg="white", padx=10, pady=5)
+    rtsp_button.pack(pady=10)
 
-# Button to upload a video or GIF file
-upload_button = Button(root, text="Upload Video/GIF", command=upload_file, font=("Helvetica", 12), bg="#2196F3", fg="white", padx=10, pady=5)
-upload_button.pack(pady=10)
+    # Button to upload a video or GIF file
+    upload_button = Button(root, text="Upload Video/GIF", command=upload_file, font=("Helvetica", 12), bg="#2196F3", fg="white", padx=10, pady=5)
+    upload_button.pack(pady=10)
 
-root.mainloop()
+    root.after_idle(lambda: print(f"UI ready {time.perf_counter() - startup_start:.2f}s after startup"))
+    root.mainloop()
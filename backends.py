@@ -0,0 +1,166 @@
+import argparse
+import hashlib
+import os
+import shutil
+import time
+
+import numpy as np
+
+from postprocess import extract_detections
+from tracker import iou_matrix
+
+# 'torch' runs the .pt weights eagerly; the others run an exported copy on CPU
+BACKENDS = ('torch', 'onnx', 'openvino')
+
+
+def file_content_hash(path, chunk_size=1 << 20):
+    # Identifies weights and videos by content, for caches that must not survive a change
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def exported_path(weights, backend, imgsz):
+    # Exported artifacts are cached next to the .pt file, one per backend and input size
+    stem = os.path.splitext(weights)[0]
+    if backend == 'onnx':
+        return f"{stem}_{imgsz}.onnx"
+    return f"{stem}_{imgsz}_openvino_model"
+
+
+def export_model(weights, backend, imgsz=640):
+    # Exports once; later calls reuse the cached artifact unless the .pt file is newer
+    target = exported_path(weights, backend, imgsz)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(weights):
+        return target
+
+    from ultralytics import YOLO
+
+    print(f"Exporting {weights} to {backend} ({imgsz}px)...")
+    produced = str(YOLO(weights).export(format=backend, imgsz=imgsz, dynamic=True))
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.replace(produced, target)
+    return target
+
+
+def limit_threads(model, backend, threads, model_path):
+    # Applies the thread count to the runtime session ultralytics created for the model
+    runtime = getattr(model.predictor, 'model', None) if model.predictor is not None else None
+    if backend == 'onnx' and getattr(runtime, 'session', None) is not None:
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        runtime.session = ort.InferenceSession(model_path, options, providers=runtime.session.get_providers())
+    elif backend == 'openvino' and getattr(runtime, 'ov_compiled_model', None) is not None:
+        import openvino as ov
+
+        core = ov.Core()
+        xml_path = next(os.path.join(model_path, name) for name in os.listdir(model_path) if name.endswith('.xml'))
+        config = {'INFERENCE_NUM_THREADS': threads, 'PERFORMANCE_HINT': 'LATENCY'}
+        runtime.ov_compiled_model = core.compile_model(core.read_model(xml_path), 'CPU', config)
+    else:
+        print(f"Could not set the thread count for the {backend} backend; using the runtime default")
+
+
+def warm_up(model, imgsz=640, runs=2):
+    # The first calls build the predictor and allocate buffers; do that before real frames arrive
+    blank = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    for _ in range(runs):
+        model(blank, verbose=False)
+
+
+def load_model(weights, backend='torch', threads=None, imgsz=640, warmup=True):
+    # Returns an ultralytics YOLO object, so callers keep using model(frame) and model.names
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+    from ultralytics import YOLO
+
+    if backend == 'torch':
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        model_path = weights
+        model = YOLO(weights)
+    else:
+        model_path = export_model(weights, backend, imgsz)
+        model = YOLO(model_path, task='detect')
+    model.overrides['imgsz'] = imgsz  # Every call uses the configured input size
+
+    # The runtime session only exists after a first call, so a thread limit needs one too
+    if warmup or (threads and backend != 'torch'):
+        warm_up(model, imgsz)
+    if threads and backend != 'torch':
+        limit_threads(model, backend, threads, model_path)
+        warm_up(model, imgsz, runs=1)
+    return model
+
+
+def parity_check(reference_model, candidate_model, frames, min_confidence=0.25, iou_tolerance=0.9, conf_tolerance=0.05):
+    # Every reference box must have a same-class match in the candidate output with
+    # IoU >= iou_tolerance and a confidence within conf_tolerance, and vice versa
+    mismatches = []
+    for index, frame in enumerate(frames):
+        reference = extract_detections(reference_model(frame, verbose=False)[0], min_confidence=min_confidence)
+        candidate = extract_detections(candidate_model(frame, verbose=False)[0], min_confidence=min_confidence)
+        if len(reference) != len(candidate):
+            mismatches.append((index, f"{len(reference)} boxes vs {len(candidate)}"))
+            continue
+        if len(reference) == 0:
+            continue
+        ious = iou_matrix(reference.xyxy, candidate.xyxy)
+        ious[reference.class_id[:, None] != candidate.class_id[None, :]] = 0.0
+        best = ious.argmax(axis=1)
+        if (ious.max(axis=1) < iou_tolerance).any():
+            mismatches.append((index, f"box IoU below {iou_tolerance}"))
+        elif (np.abs(reference.confidence - candidate.confidence[best]) > conf_tolerance).any():
+            mismatches.append((index, f"confidence differs by more than {conf_tolerance}"))
+    return len(mismatches) == 0, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export YOLO weights to a CPU backend and check it against PyTorch")
+    parser.add_argument('weights', help="Trained YOLOv8 .pt weights")
+    parser.add_argument('--backend', choices=BACKENDS[1:], default='onnx')
+    parser.add_argument('--imgsz', type=int, default=640, help="Model input size")
+    parser.add_argument('--threads', type=int, help="Inference threads for the backend")
+    parser.add_argument('--video', help="Video whose frames are used for the parity check")
+    parser.add_argument('--frames', type=int, default=20, help="Frames used for the parity check")
+    args = parser.parse_args()
+
+    import cv2
+
+    start = time.perf_counter()
+    candidate = load_model(args.weights, args.backend, args.threads, args.imgsz)
+    print(f"{args.backend} model ready in {time.perf_counter() - start:.1f}s")
+    if not args.video:
+        return
+
+    cap = cv2.VideoCapture(args.video)
+    frames = []
+    while len(frames) < args.frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+
+    reference = load_model(args.weights, 'torch', args.threads, args.imgsz)
+    for name, model in (('torch', reference), (args.backend, candidate)):
+        start = time.perf_counter()
+        for frame in frames:
+            model(frame, verbose=False)
+        print(f"{name}: {len(frames) / max(time.perf_counter() - start, 1e-9):.1f} FPS")
+
+    ok, mismatches = parity_check(reference, candidate, frames)
+    print("Parity check passed" if ok else f"Parity check failed on {len(mismatches)} frames:")
+    for index, reason in mismatches:
+        print(f"  frame {index}: {reason}")
+
+
+if __name__ == '__main__':
+    main()
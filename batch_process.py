@@ -0,0 +1,170 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from backends import BACKENDS, export_model, load_model
+from detector import FrameDetector
+from roi import load_roi_settings, region_inference_for
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+
+# kind is 'detection' (raw model output, with its confidence) or 'track' (a confirmed
+# tracker box, with the track's windowed mean score, where missed runs count as 0)
+CSV_FIELDS = ['video', 'frame', 'time_ms', 'shoplifting', 'kind', 'track_id', 'class_id', 'confidence', 'track_score',
+              'x1', 'y1', 'x2', 'y2']
+
+# One model per worker process, loaded by the pool initializer
+worker_model = None
+
+
+def collect_videos(inputs):
+    # Directories are searched recursively; anything else is treated as a glob or a path
+    video_files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                for file in sorted(files):
+                    if file.lower().endswith(VIDEO_EXTENSIONS):
+                        video_files.append(os.path.join(root, file))
+        else:
+            video_files.extend(sorted(glob.glob(item, recursive=True)))
+    return sorted(set(video_files))
+
+
+def init_worker(model_path, backend, threads_per_worker, imgsz):
+    global worker_model
+    # Keep workers from oversubscribing the cores between them
+    worker_model = load_model(model_path, backend=backend, threads=threads_per_worker, imgsz=imgsz)
+
+
+def output_path_for(video_path, output_dir, output_format):
+    # Keep the directory in the name so clips with the same file name do not collide
+    name = os.path.normpath(os.path.splitext(video_path)[0]).lstrip(os.sep).replace(os.sep, '__')
+    return os.path.join(output_dir, f"{name}.{output_format}")
+
+
+def process_file(video_path, output_path, output_format, class_ids, min_confidence, detect_every, roi_settings=None,
+                 include_tracks=False):
+    # Writes the raw model detections of every frame the model ran on; include_tracks adds the
+    # confirmed tracks the shoplifting flag is computed from
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Unable to open video source: {video_path}")
+
+    detector = FrameDetector(worker_model, class_ids=class_ids, min_confidence=min_confidence, detect_every=detect_every,
+                             regions=region_inference_for(video_path, roi_settings))
+    frame_count = 0
+    start = time.perf_counter()
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.writer(f) if output_format == 'csv' else None
+        if writer is not None:
+            writer.writerow(CSV_FIELDS)
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            time_ms = round(cap.get(cv2.CAP_PROP_POS_MSEC), 1)
+            tracks, is_shoplifting, ran_model = detector.process(frame)
+            detections = [{'class_id': class_id, 'confidence': confidence, 'box': box}
+                          for box, confidence, class_id in zip(detector.raw_detections.xyxy.round(1).tolist(),
+                                                                detector.raw_detections.confidence.round(4).tolist(),
+                                                                detector.raw_detections.class_id.tolist())]
+            track_records = []
+            if include_tracks:
+                track_records = [{'track_id': track_id, 'class_id': class_id, 'track_score': score, 'box': box}
+                                 for box, score, class_id, track_id in zip(tracks.xyxy.round(1).tolist(),
+                                                                           tracks.confidence.round(4).tolist(),
+                                                                           tracks.class_id.tolist(),
+                                                                           tracks.track_id.tolist() if len(tracks) else [])]
+
+            if writer is not None:
+                # One row per detection, then one per track
+                for detection in detections:
+                    writer.writerow([video_path, frame_count, time_ms, int(is_shoplifting), 'detection', None,
+                                     detection['class_id'], detection['confidence'], None] + detection['box'])
+                for track in track_records:
+                    writer.writerow([video_path, frame_count, time_ms, int(is_shoplifting), 'track', track['track_id'],
+                                     track['class_id'], None, track['track_score']] + track['box'])
+            else:
+                # One record per frame
+                record = {
+                    'video': video_path,
+                    'frame': frame_count,
+                    'time_ms': time_ms,
+                    'shoplifting': bool(is_shoplifting),
+                    'detector_ran': ran_model,
+                    'detections': detections,
+                }
+                if include_tracks:
+                    record['tracks'] = track_records
+                f.write(json.dumps(record) + '\n')
+            frame_count += 1
+
+    cap.release()
+    return video_path, frame_count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run shoplift detection headlessly over video archives")
+    parser.add_argument('inputs', nargs='+', help="Video files, directories or glob patterns")
+    parser.add_argument('--model', default='best_model_v7.pt', help="Trained YOLOv8 weights")
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help="Inference backend")
+    parser.add_argument('--imgsz', type=int, default=640, help="Model input size")
+    parser.add_argument('--output', default='detections', help="Directory for the per-video detection files")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl', help="Output format")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--classes', type=int, nargs='+', default=[0], help="Class IDs to keep")
+    parser.add_argument('--min-confidence', type=float, default=0.5, help="Minimum detection confidence")
+    parser.add_argument('--detect-every', type=int, default=1, help="Run the model every N frames and track in between")
+    parser.add_argument('--roi', default='roi.json', help="Per-video regions of interest (used if the file exists)")
+    parser.add_argument('--tracks', action='store_true', help="Also write the confirmed tracks behind the shoplifting flag")
+    args = parser.parse_args()
+
+    roi_settings = load_roi_settings(args.roi)
+    video_files = collect_videos(args.inputs)
+    if not video_files:
+        parser.error("No video files found")
+    os.makedirs(args.output, exist_ok=True)
+    if args.backend != 'torch':
+        export_model(args.model, args.backend, args.imgsz)  # Once, before the workers race to do it
+
+    workers = max(1, min(args.workers, len(video_files)))
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Processing {len(video_files)} videos with {workers} workers ({threads_per_worker} threads each)")
+
+    total_frames = 0
+    failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(args.model, args.backend, threads_per_worker, args.imgsz)) as executor:
+        futures = {
+            executor.submit(process_file, video_path, output_path_for(video_path, args.output, args.format),
+                            args.format, args.classes, args.min_confidence, args.detect_every, roi_settings,
+                            args.tracks): video_path
+            for video_path in video_files
+        }
+        for future in as_completed(futures):
+            try:
+                video_path, frame_count, seconds = future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"Failed: {futures[future]}: {exc}")
+                continue
+            total_frames += frame_count
+            print(f"{video_path}: {frame_count} frames in {seconds:.1f}s ({frame_count / max(seconds, 1e-9):.1f} FPS)")
+
+    elapsed = time.perf_counter() - start
+    print(f"Done: {total_frames} frames from {len(video_files) - failed} videos in {elapsed:.1f}s "
+          f"({total_frames / max(elapsed, 1e-9):.1f} frames/sec aggregate)")
+    if failed:
+        print(f"{failed} videos failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from backends import BACKENDS, load_model
+from display import DISPLAY_SIZE, render_for_display
+from postprocess import annotate, extract_detections
+from video_writer import SegmentedVideoWriter
+
+STAGES = ['decode', 'infer', 'postprocess', 'annotate', 'write', 'display']
+
+
+def make_synthetic_video(path, frames=300, width=1280, height=720, fps=25.0, seed=0):
+    # A few moving rectangles over a noisy shelf-like background, so decoding and
+    # the model see realistic, changing content without any camera or network
+    rng = np.random.default_rng(seed)
+    background = rng.integers(60, 120, size=(height, width, 3), dtype=np.uint8)
+    for x in range(0, width, 160):
+        cv2.rectangle(background, (x, 0), (x + 20, height), (40, 40, 40), -1)
+    objects = [(rng.integers(0, width - 200), rng.integers(0, height - 300), rng.integers(-8, 9), rng.integers(-4, 5),
+                tuple(int(c) for c in rng.integers(0, 255, size=3))) for _ in range(4)]
+
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    for i in range(frames):
+        frame = background.copy()
+        for x, y, dx, dy, color in objects:
+            x1 = int((x + dx * i) % (width - 200))
+            y1 = int((y + dy * i) % (height - 300))
+            cv2.rectangle(frame, (x1, y1), (x1 + 120, y1 + 260), color, -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def percentiles(samples):
+    values = np.asarray(samples, dtype=np.float64) * 1000.0  # milliseconds
+    if len(values) == 0:
+        return {}
+    return {
+        'mean_ms': round(float(values.mean()), 3),
+        'p50_ms': round(float(np.percentile(values, 50)), 3),
+        'p90_ms': round(float(np.percentile(values, 90)), 3),
+        'p99_ms': round(float(np.percentile(values, 99)), 3),
+        'max_ms': round(float(values.max()), 3),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024.0 * 1024.0 if platform.system() == 'Darwin' else 1024.0), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(model, video_path, output_dir, warmup=5, display_size=DISPLAY_SIZE):
+    # Same path as the entry points: decode -> model() -> post-process -> annotate -> write/display
+    timings = {stage: [] for stage in STAGES}
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Unable to open video source: {video_path}")
+    writer = SegmentedVideoWriter(output_dir, prefix='benchmark', fps=cap.get(cv2.CAP_PROP_FPS))
+
+    frame_count = 0
+    start = None
+    while True:
+        t0 = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        t1 = time.perf_counter()
+        results = model(frame, verbose=False)
+        t2 = time.perf_counter()
+        detections = extract_detections(results[0], min_confidence=0.5)
+        t3 = time.perf_counter()
+        annotate(frame, detections, model.names)
+        t4 = time.perf_counter()
+        writer.write(frame, frame_count)
+        t5 = time.perf_counter()
+        # The GUI's display path (shrink, draw at display size, convert) minus the PhotoImage paste
+        render_for_display(frame, display_size, detections=detections, names=model.names)
+        t6 = time.perf_counter()
+
+        frame_count += 1
+        if frame_count <= warmup:
+            continue  # Warm-up frames are not measured
+        if start is None:
+            start = t0
+        for stage, seconds in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5)):
+            timings[stage].append(seconds)
+
+    writer.close()
+    cap.release()
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    measured = max(0, frame_count - warmup)
+    return {
+        'frames': measured,
+        'fps': round(measured / elapsed, 2) if elapsed > 0 else 0.0,
+        'stages': {stage: percentiles(samples) for stage, samples in timings.items()},
+    }
+
+
+def compare(current, previous):
+    print(f"FPS: {previous['fps']} -> {current['fps']} ({(current['fps'] / max(previous['fps'], 1e-9) - 1) * 100:+.1f}%)")
+    for stage in STAGES:
+        before = previous['stages'].get(stage, {}).get('p50_ms')
+        after = current['stages'].get(stage, {}).get('p50_ms')
+        if before and after:
+            print(f"  {stage:12s} p50 {before:8.2f} -> {after:8.2f} ms ({(after / before - 1) * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the detection pipeline on synthetic video")
+    parser.add_argument('--model', default='best_v2.pt', help="Trained YOLOv8 weights")
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help="Inference backend")
+    parser.add_argument('--threads', type=int, help="Inference threads")
+    parser.add_argument('--imgsz', type=int, default=640, help="Model input size")
+    parser.add_argument('--video', help="Use this video instead of generating one")
+    parser.add_argument('--frames', type=int, default=300, help="Frames in the synthetic video")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--warmup', type=int, default=5, help="Frames excluded from the measurements")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to save the JSON results")
+    parser.add_argument('--compare', help="Earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        video_path = args.video or make_synthetic_video(os.path.join(work_dir, 'synthetic.mp4'), args.frames,
+                                                        args.width, args.height)
+        load_start = time.perf_counter()
+        model = load_model(args.model, backend=args.backend, threads=args.threads, imgsz=args.imgsz)
+        load_seconds = time.perf_counter() - load_start
+        result = run_benchmark(model, video_path, os.path.join(work_dir, 'output'), warmup=args.warmup)
+
+    result.update({
+        'model': args.model,
+        'backend': args.backend,
+        'imgsz': args.imgsz,
+        'model_load_s': round(load_seconds, 3),
+        'video': args.video or f"synthetic {args.width}x{args.height} x{args.frames}",
+        'peak_rss_mb': peak_rss_mb(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    })
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    print(f"{result['frames']} frames at {result['fps']} FPS, peak RSS {result['peak_rss_mb']} MB")
+    for stage, stats in result['stages'].items():
+        if stats:
+            print(f"  {stage:12s} p50 {stats['p50_ms']:8.2f} ms  p90 {stats['p90_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms")
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import threading
+import time
+
+import cv2
+
+from gif_player import GifCapture
+from metrics import metrics
+from pipeline import is_live_source
+from video_writer import segment_prefix
+
+
+class LiveCapture:
+    # cv2.VideoCapture-like reader for live streams. A grabber thread reads the
+    # stream as fast as it delivers and keeps only the newest frame, so a slow
+    # model never makes OpenCV's internal buffer (and the picture) lag behind real
+    # time. Frames replaced before anyone read them are counted as dropped, and a
+    # stream that drops is reopened with exponential backoff.
+    # realtime=True paces a file at its own FPS, so a local file can stand in for a camera.
+
+    # release() may be called from any thread and makes a blocked read() return (False, None)
+    release_wakes_reader = True
+
+    def __init__(self, source, name=None, realtime=False, reconnect=True, initial_backoff=0.5, max_backoff=30.0):
+        self.source = source
+        self.name = str(name) if name is not None else segment_prefix(source)
+        self.realtime = realtime
+        self.reconnect = reconnect
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.condition = threading.Condition()
+        self.frame = None
+        self.frame_time = None
+        self.sequence = 0  # Frames grabbed
+        self.read_sequence = 0  # Sequence number of the last frame handed out
+        self.dropped = 0
+        self.reconnects = 0
+        self.connected = False
+        self.ended = False
+        self.fps = 0.0
+        self.width = 0
+        self.height = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # A source that cannot be opened at all is reported, not retried
+        cap = self._open()
+        if cap is None:
+            self.ended = True  # read() returns (False, None) instead of waiting for a grabber
+            return
+        self.thread = threading.Thread(target=self._grab_loop, args=(cap,), daemon=True)
+        self.thread.start()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Ignored by backends that don't support it
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.width = cap.get(cv2.CAP_PROP_FRAME_WIDTH)
+        self.height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        self.connected = True
+        return cap
+
+    def _grab_loop(self, cap):
+        backoff = self.initial_backoff
+        next_frame_time = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                if cap is None:
+                    if not self.reconnect:
+                        break
+                    print(f"{self.name}: stream lost, reconnecting in {backoff:.1f}s")
+                    if self.stop_event.wait(backoff):
+                        break
+                    backoff = min(backoff * 2, self.max_backoff)
+                    cap = self._open()
+                    if cap is not None:
+                        self.reconnects += 1
+                        metrics.inc('shoplift_reconnects_total', stream=self.name)
+                        print(f"{self.name}: reconnected")
+                    continue
+
+                ret, frame = cap.read()
+                if not ret:
+                    cap.release()
+                    cap = None
+                    self.connected = False
+                    continue
+                backoff = self.initial_backoff
+
+                if self.realtime and self.fps > 0:
+                    next_frame_time = max(next_frame_time + 1.0 / self.fps, time.monotonic())
+                    self.stop_event.wait(next_frame_time - time.monotonic())
+
+                with self.condition:
+                    if self.sequence > self.read_sequence:
+                        # The previous frame was never read; the newer one replaces it
+                        self.dropped += 1
+                        metrics.inc('shoplift_dropped_frames_total', stream=self.name)
+                    self.frame = frame
+                    self.frame_time = time.monotonic()
+                    self.sequence += 1
+                    self.condition.notify_all()
+        finally:
+            if cap is not None:
+                cap.release()
+            self.connected = False
+            with self.condition:
+                self.ended = True
+                self.condition.notify_all()
+
+    def isOpened(self):
+        return self.thread is not None
+
+    def read(self):
+        # Waits for a frame newer than the last one read (through reconnects) and returns it
+        with self.condition:
+            while self.sequence == self.read_sequence and not self.ended:
+                self.condition.wait()
+            if self.sequence == self.read_sequence:
+                return False, None
+            self.read_sequence = self.sequence
+            frame = self.frame
+        metrics.set('shoplift_frame_staleness_seconds', self.staleness(), stream=self.name)
+        return True, frame
+
+    def staleness(self):
+        # Seconds since the newest frame arrived; grows while the stream is stalled or reconnecting
+        if self.frame_time is None:
+            return 0.0
+        return time.monotonic() - self.frame_time
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.read_sequence)
+        return 0.0
+
+    def release(self):
+        self.stop_event.set()
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+        if self.thread is not None and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+
+def open_capture(video_source, name=None):
+    # GIFs are read with GifCapture, live streams with LiveCapture, files with OpenCV
+    if isinstance(video_source, str) and video_source.lower().endswith('.gif'):
+        return GifCapture(video_source)
+    if is_live_source(video_source):
+        return LiveCapture(int(video_source) if str(video_source).isdigit() else video_source, name=name)
+    return cv2.VideoCapture(video_source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check live capture latency against a stream or a file played in real time")
+    parser.add_argument('source', help="Stream URL, camera index, or a video file to stand in for a camera")
+    parser.add_argument('--process-ms', type=float, default=200.0, help="Simulated per-frame model time")
+    parser.add_argument('--seconds', type=float, default=20.0, help="How long to run")
+    parser.add_argument('--no-reconnect', action='store_true', help="Stop at the end of the stream instead of reopening it")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    cap = LiveCapture(source, realtime=not is_live_source(source), reconnect=not args.no_reconnect)
+    if not cap.isOpened():
+        print(f"Unable to open {args.source}")
+        return
+    end = time.monotonic() + args.seconds
+    frames = 0
+    worst = 0.0
+    while time.monotonic() < end:
+        ret, _ = cap.read()
+        if not ret:
+            break
+        frames += 1
+        time.sleep(args.process_ms / 1000.0)  # Stand-in for inference
+        worst = max(worst, cap.staleness())
+    cap.release()
+    print(f"{frames} frames processed, {cap.dropped} dropped, {cap.reconnects} reconnects, "
+          f"worst staleness {worst * 1000:.0f} ms (bounded by one frame interval plus --process-ms)")
+
+
+if __name__ == '__main__':
+    main()
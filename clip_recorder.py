@@ -0,0 +1,112 @@
+import collections
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# Marks the end of the flush queue
+CLOSE = object()
+
+
+class ClipRecorder:
+    # Keeps the last pre_seconds of a source as downscaled JPEGs in a fixed-size
+    # ring buffer. A trigger turns the buffer plus the next post_seconds into one
+    # clip; triggers that arrive while a clip is still open extend it, so
+    # overlapping events end up in a single file. Clips are encoded and written
+    # on a background thread.
+
+    def __init__(self, output_dir, prefix='camera', fps=25.0, pre_seconds=5.0, post_seconds=5.0,
+                 max_event_seconds=120.0, max_width=960, jpeg_quality=80):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.post_frames = int(post_seconds * self.fps)
+        self.max_event_frames = int(max_event_seconds * self.fps)
+        self.max_width = max_width
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.ring = collections.deque(maxlen=max(1, int(pre_seconds * self.fps)))
+        self.event_frames = None
+        self.event_end = None
+        self.last_flushed = -1
+        self.clips_written = []
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def _compress(self, frame, overlay=None):
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if width > self.max_width:
+            scale = self.max_width / width
+            frame = cv2.resize(frame, (self.max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+        elif overlay is not None:
+            frame = frame.copy()  # Never draw on the caller's frame
+        if overlay is not None:
+            overlay(frame, scale)
+        ok, encoded = cv2.imencode('.jpg', frame, self.encode_params)
+        return encoded if ok else None
+
+    def add(self, frame, frame_number, triggered=False, overlay=None):
+        # overlay(frame, scale) draws boxes on the downscaled copy, so they are
+        # drawn at clip resolution rather than on the full-size frame
+        encoded = self._compress(frame, overlay)
+        if encoded is None:
+            return
+        entry = (frame_number, encoded)
+        self.ring.append(entry)
+
+        if self.event_frames is None:
+            if not triggered:
+                return
+            # Start a clip with the pre-event footage not already in an earlier clip
+            self.event_frames = [item for item in self.ring if item[0] > self.last_flushed]
+            self.event_end = frame_number + self.post_frames
+            return
+
+        self.event_frames.append(entry)
+        if triggered:
+            self.event_end = max(self.event_end, frame_number + self.post_frames)
+        if frame_number >= self.event_end or len(self.event_frames) >= self.max_event_frames:
+            self._finish_event()
+
+    def _finish_event(self):
+        self.last_flushed = self.event_frames[-1][0]
+        self.pending.put(self.event_frames)
+        self.event_frames = None
+        self.event_end = None
+
+    def _flush_loop(self):
+        while True:
+            frames = self.pending.get()
+            if frames is CLOSE:
+                break
+            try:
+                self._write_clip(frames)
+            except Exception as exc:
+                print(f"Failed to write clip: {exc}")
+
+    def _write_clip(self, frames):
+        first, last = frames[0][0], frames[-1][0]
+        clip_path = os.path.join(self.output_dir, f"{self.prefix}_{time.strftime('%Y%m%d_%H%M%S')}_{first}-{last}.mp4")
+        writer = None
+        for _, encoded in frames:
+            image = cv2.imdecode(np.asarray(encoded), cv2.IMREAD_COLOR)
+            if writer is None:
+                height, width = image.shape[:2]
+                writer = cv2.VideoWriter(clip_path, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (width, height))
+            writer.write(image)
+        if writer is not None:
+            writer.release()
+            self.clips_written.append(clip_path)
+
+    def close(self):
+        # Flushes an open event with whatever post-event footage was collected
+        if self.event_frames:
+            self._finish_event()
+        self.pending.put(CLOSE)
+        self.thread.join()
@@ -0,0 +1,230 @@
+import argparse
+import datetime
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Marks the end of the writer queue
+CLOSE = object()
+
+# Default database file, next to the annotated video segments
+DETECTION_DB_PATH = os.path.join('tested', 'detections.db')
+
+# One row per frame with detections and one compact row per box; the indexes cover
+# the usual investigations: a camera over a time window, and class/confidence filters
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS classes (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    frame_index INTEGER NOT NULL,
+    timestamp REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS detections (
+    frame_id INTEGER NOT NULL REFERENCES frames(id),
+    class_id INTEGER NOT NULL REFERENCES classes(id),
+    confidence REAL NOT NULL,
+    x1 INTEGER NOT NULL, y1 INTEGER NOT NULL, x2 INTEGER NOT NULL, y2 INTEGER NOT NULL,
+    track_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_frames_source_time ON frames(source_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_frames_time ON frames(timestamp);
+CREATE INDEX IF NOT EXISTS idx_detections_frame ON detections(frame_id);
+CREATE INDEX IF NOT EXISTS idx_detections_class_confidence ON detections(class_id, confidence);
+"""
+
+# Query rows joined back to their frame, source and class names
+JOINS = """
+FROM detections d
+JOIN frames f ON f.id = d.frame_id
+JOIN sources s ON s.id = f.source_id
+JOIN classes c ON c.id = d.class_id
+"""
+
+
+def open_store(db_path=DETECTION_DB_PATH):
+    # Connection with the schema in place; WAL lets queries run while a writer is busy
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(db_path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def to_timestamp(value):
+    # Accepts epoch seconds, a datetime or an ISO string such as '2026-10-18 14:00' (local time)
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+class DetectionStore:
+    # Persists the detections of every frame to SQLite. add() only queues a reference
+    # to the frame's arrays; a background thread turns them into rows and commits
+    # them in batches, so the detection loop never waits on the database.
+
+    def __init__(self, db_path=DETECTION_DB_PATH, batch_size=256, flush_seconds=1.0, queue_size=1024):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.items = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.error = None
+        open_store(db_path).close()  # Create the schema before the first write
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def add(self, source, frame_index, detections, names, timestamp=None):
+        # Frames without detections are not stored
+        if len(detections) == 0:
+            return
+        item = (str(source), frame_index, time.time() if timestamp is None else timestamp, detections, names)
+        try:
+            self.items.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _lookup(self, connection, cache, table, name):
+        if name not in cache:
+            connection.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            cache[name] = connection.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+        return cache[name]
+
+    def _write_batch(self, connection, batch, source_ids, class_ids):
+        with connection:  # One transaction per batch
+            for source, frame_index, timestamp, detections, names in batch:
+                source_id = self._lookup(connection, source_ids, 'sources', source)
+                frame_id = connection.execute(
+                    "INSERT INTO frames (source_id, frame_index, timestamp) VALUES (?, ?, ?)",
+                    (source_id, frame_index, timestamp)).lastrowid
+                boxes = np.rint(detections.xyxy).astype(np.int64).tolist()
+                track_ids = [None] * len(detections) if detections.track_id is None else detections.track_id.tolist()
+                rows = [(frame_id, self._lookup(connection, class_ids, 'classes', names.get(class_id, str(class_id))),
+                         confidence, *box, track_id)
+                        for class_id, confidence, box, track_id in zip(detections.class_id.tolist(),
+                                                                       detections.confidence.tolist(), boxes, track_ids)]
+                connection.executemany("INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self.written += len(rows)
+
+    def _write_loop(self):
+        connection = sqlite3.connect(self.db_path)
+        source_ids, class_ids = {}, {}
+        batch = []
+        deadline = None
+        closing = False
+        while not closing:
+            timeout = self.flush_seconds if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.items.get(timeout=timeout)
+                if item is CLOSE:
+                    closing = True
+                else:
+                    if not batch:
+                        deadline = time.monotonic() + self.flush_seconds
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            # Commit when the batch is full, flush_seconds after its first frame, or on close
+            if batch and (closing or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                if self.error is None:
+                    try:
+                        self._write_batch(connection, batch, source_ids, class_ids)
+                    except Exception as exc:
+                        self.error = exc
+                batch = []
+                deadline = None
+        connection.close()
+
+    def close(self):
+        self.items.put(CLOSE)
+        self.thread.join()
+        if self.error is not None:
+            print(f"Detection store failed: {self.error}")
+        if self.dropped:
+            print(f"Detection store dropped {self.dropped} frames (queue full)")
+
+
+def _filters(source=None, class_name=None, min_confidence=None, start=None, end=None):
+    clauses, params = [], []
+    if source is not None:
+        clauses.append("s.name = ?")
+        params.append(str(source))
+    if class_name is not None:
+        clauses.append("c.name = ?")
+        params.append(class_name)
+    if min_confidence is not None:
+        clauses.append("d.confidence >= ?")
+        params.append(min_confidence)
+    if start is not None:
+        clauses.append("f.timestamp >= ?")
+        params.append(to_timestamp(start))
+    if end is not None:
+        clauses.append("f.timestamp < ?")
+        params.append(to_timestamp(end))
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query_hits(connection, source=None, class_name=None, min_confidence=None, start=None, end=None, limit=None):
+    # e.g. query_hits(conn, 'rtsp://cam3/stream', 'shoplift', 0.6, '2026-10-18 14:00', '2026-10-18 15:00')
+    where, params = _filters(source, class_name, min_confidence, start, end)
+    sql = ("SELECT s.name AS source, f.frame_index, f.timestamp, c.name AS class_name, d.confidence, "
+           "d.x1, d.y1, d.x2, d.y2, d.track_id" + JOINS + where + " ORDER BY f.timestamp")
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return [dict(row) for row in connection.execute(sql, params)]
+
+
+def frames_per_hour(connection, source=None, class_name=None, min_confidence=None, start=None, end=None):
+    # Number of frames with at least one matching detection, per source and local-time
+    # hour (so half-hour time zones get their own hours); 'hour' is the hour's start timestamp
+    where, params = _filters(source, class_name, min_confidence, start, end)
+    sql = ("SELECT s.name AS source, CAST(strftime('%s', strftime('%Y-%m-%d %H:00:00', f.timestamp, 'unixepoch', "
+           "'localtime'), 'utc') AS INTEGER) AS hour, "
+           "COUNT(DISTINCT f.id) AS frames" + JOINS + where + " GROUP BY s.name, hour ORDER BY hour, s.name")
+    return [dict(row) for row in connection.execute(sql, params)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the stored detections")
+    parser.add_argument('query', choices=('hits', 'hourly'), help="Individual detections, or frames with detections per hour")
+    parser.add_argument('--db', default=DETECTION_DB_PATH, help="Detection database")
+    parser.add_argument('--source', help="Source as it was opened (file path, stream URL or camera index)")
+    parser.add_argument('--class-name', help="Class name, e.g. shoplift")
+    parser.add_argument('--min-confidence', type=float)
+    parser.add_argument('--start', help="Start time, e.g. '2026-10-18 14:00'")
+    parser.add_argument('--end', help="End time, e.g. '2026-10-18 15:00'")
+    parser.add_argument('--limit', type=int, help="Maximum number of hits")
+    args = parser.parse_args()
+
+    connection = open_store(args.db)
+    filters = dict(source=args.source, class_name=args.class_name, min_confidence=args.min_confidence,
+                   start=args.start, end=args.end)
+    start = time.perf_counter()
+    if args.query == 'hits':
+        rows = query_hits(connection, limit=args.limit, **filters)
+        for row in rows:
+            when = datetime.datetime.fromtimestamp(row['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{when}  {row['source']}  frame {row['frame_index']}  {row['class_name']} {row['confidence']:.2f}  "
+                  f"[{row['x1']}, {row['y1']}, {row['x2']}, {row['y2']}]")
+    else:
+        rows = frames_per_hour(connection, **filters)
+        for row in rows:
+            when = datetime.datetime.fromtimestamp(row['hour']).strftime('%Y-%m-%d %H:00')
+            print(f"{when}  {row['source']}  {row['frames']} frames")
+    print(f"{len(rows)} rows in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+from postprocess import Detections, extract_detections, shoplifting_detection_logic
+from tracker import IoUTracker
+
+
+class FrameDetector:
+    # Per-source detection state shared by the GUI scripts and the headless tools:
+    # optional motion gate and regions of interest, detector every N frames, tracker
+    # in between and the shoplifting rule evaluated once per frame on the confirmed tracks.
+
+    def __init__(self, model, class_ids=(0,), min_confidence=0.5, detect_every=3, motion_gate=None, regions=None):
+        self.model = model
+        self.class_ids = list(class_ids)
+        self.min_confidence = min_confidence
+        self.detect_every = detect_every
+        self.motion_gate = motion_gate
+        self.regions = regions  # Optional roi.RegionInference for this camera
+        self.tracker = IoUTracker()
+        self.frame_index = 0
+        self.scene_static = False  # The motion gate rejected the last detector frame
+        # Model output for the current frame with the track each box went to, empty if the model did not run
+        self.raw_detections = Detections.empty()
+
+    def process(self, frame):
+        # Returns (confirmed detections, is_shoplifting, whether the model ran)
+        ran_model = False
+        self.raw_detections = Detections.empty()
+        detector_frame = self.frame_index % self.detect_every == 0
+        if detector_frame:
+            self.scene_static = self.motion_gate is not None and not self.motion_gate.should_infer(frame)
+        if detector_frame and not self.scene_static:
+            if self.regions is not None:
+                found = self.regions.detect(self.model, frame, class_ids=self.class_ids, min_confidence=self.min_confidence)
+            else:
+                results = self.model(frame, verbose=False)
+                found = extract_detections(results[0], class_ids=self.class_ids, min_confidence=self.min_confidence)
+            self.tracker.update(found.xyxy, found.confidence, found.class_id)
+            self.raw_detections = Detections(found.xyxy, found.confidence, found.class_id, self.tracker.detection_track_ids)
+            ran_model = True
+        elif self.scene_static:
+            self.tracker.hold()  # Reuse the last boxes as they are until something moves
+        else:
+            self.tracker.predict()
+        self.frame_index += 1
+
+        detections = Detections.from_tracks(self.tracker.confirmed_tracks())
+        return detections, len(detections) > 0 and shoplifting_detection_logic(detections), ran_model
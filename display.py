@@ -0,0 +1,40 @@
+import cv2
+from PIL import Image, ImageTk
+
+from postprocess import annotate
+
+# Size of the video area in the window
+DISPLAY_SIZE = (600, 400)
+
+
+def render_for_display(frame, size=DISPLAY_SIZE, detections=None, names=None, color=None, lines=()):
+    # Runs on the inference worker: shrinks the frame to the display size first, so the
+    # color conversion and the drawing only touch display pixels, and draws the boxes
+    # and stats lines at display scale. Returns an RGB array of the display size.
+    height, width = frame.shape[:2]
+    small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    if detections is not None and len(detections):
+        annotate(small, detections.scaled(size[0] / width, size[1] / height), names, color=color,
+                 thickness=2, font_scale=0.5, text_thickness=1)
+    for i, line in enumerate(lines):
+        cv2.putText(small, line, (10, 20 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=small)  # In place, no second buffer
+
+
+class FrameDisplay:
+    # Tk side of the video area: one PhotoImage for the lifetime of the label,
+    # updated in place with paste() instead of a new PhotoImage per frame.
+    # The refresh rate is the caller's (gui.py takes it from its QualityController).
+
+    def __init__(self, label, size=DISPLAY_SIZE):
+        self.label = label
+        self.size = size
+        self.photo = ImageTk.PhotoImage('RGB', size)
+        self.label.configure(image=self.photo)
+        self.label.image = self.photo  # Keep a reference to avoid garbage collection
+
+    def show(self, frame):
+        image = Image.fromarray(frame)
+        if image.size != self.size:
+            image = image.resize(self.size)
+        self.photo.paste(image)
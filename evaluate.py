@@ -0,0 +1,248 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from backends import BACKENDS, export_model, file_content_hash, load_model
+from batch_process import collect_videos
+
+# Raw model outputs per clip, under one directory per model file hash and inference settings
+EVAL_CACHE_DIR = 'eval_cache'
+
+# Everything above this confidence is cached, so sweeps can start from any higher threshold
+RAW_CONFIDENCE_FLOOR = 0.05
+
+DEFAULT_THRESHOLDS = np.round(np.arange(0.1, 0.96, 0.05), 2)
+
+# Decision rules: 'class:<name>' flags a frame with a box of that class above the
+# threshold (the GUI rule); 'count:<name>:<n>' flags a frame with more than n such
+# boxes above the threshold (shoplifting_detection_logic with n=1)
+DEFAULT_RULES = ['class:shoplift', 'count:person:1']
+
+# One model per worker process, loaded by the pool initializer
+worker_model = None
+
+
+def init_worker(model_path, backend, threads_per_worker, imgsz):
+    global worker_model
+    worker_model = load_model(model_path, backend=backend, threads=threads_per_worker, imgsz=imgsz)
+
+
+def cache_dir_for(model_path, backend, imgsz):
+    return os.path.join(EVAL_CACHE_DIR, f"{file_content_hash(model_path)[:16]}_{backend}_{imgsz}_c{RAW_CONFIDENCE_FLOOR}")
+
+
+def infer_clip(video_path, cache_path, batch_size=16):
+    # Runs in a worker process: one pass of the model over every frame of the clip.
+    # The boxes of all frames go into flat arrays with a frame index column.
+    if os.path.exists(cache_path):
+        return video_path, cache_path, True
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Unable to open video source: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames, xyxy, confidence, class_id = [], [], [], []
+    frame_count = 0
+
+    def flush(batch):
+        results = worker_model([frame for _, frame in batch], conf=RAW_CONFIDENCE_FLOOR, verbose=False)
+        for (index, _), result in zip(batch, results):
+            data = result.boxes.data.cpu().numpy()  # x1, y1, x2, y2, conf, cls
+            frames.append(np.full(len(data), index, dtype=np.int32))
+            xyxy.append(data[:, :4].astype(np.float32))
+            confidence.append(data[:, -2].astype(np.float16))
+            class_id.append(data[:, -1].astype(np.int16))
+
+    batch = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        batch.append((frame_count, frame))
+        frame_count += 1
+        if len(batch) == batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    cap.release()
+
+    temporary = cache_path + '.tmp'
+    with open(temporary, 'wb') as f:
+        np.savez(f, frame=np.concatenate(frames) if frames else np.zeros(0, np.int32),
+                 xyxy=np.concatenate(xyxy) if xyxy else np.zeros((0, 4), np.float32),
+                 confidence=np.concatenate(confidence) if confidence else np.zeros(0, np.float16),
+                 class_id=np.concatenate(class_id) if class_id else np.zeros(0, np.int16),
+                 frame_count=np.int64(frame_count), fps=np.float64(fps if fps and fps > 0 else 25.0),
+                 names=np.array(json.dumps({int(k): v for k, v in worker_model.names.items()})))
+    os.replace(temporary, cache_path)
+    return video_path, cache_path, False
+
+
+def load_clip(cache_path):
+    with np.load(cache_path) as data:
+        clip = {key: data[key] for key in data.files}
+    clip['names'] = {int(k): v for k, v in json.loads(str(clip['names'])).items()}
+    clip['confidence'] = clip['confidence'].astype(np.float32)
+    return clip
+
+
+def parse_rule(rule):
+    parts = rule.split(':')
+    if parts[0] == 'class' and len(parts) == 2:
+        return 'class', parts[1], 0
+    if parts[0] == 'count' and len(parts) == 3:
+        return 'count', parts[1], int(parts[2])
+    raise ValueError(f"Unknown rule: {rule} (expected class:<name> or count:<name>:<n>)")
+
+
+def flagged_frames(clip, rule, thresholds):
+    # (thresholds, frames) boolean matrix: which frames the rule flags at each threshold
+    kind, class_name, min_count = parse_rule(rule)
+    class_ids = [i for i, name in clip['names'].items() if name.lower() == class_name.lower()]
+    frame_count = int(clip['frame_count'])
+    keep = np.isin(clip['class_id'], class_ids)
+    frame, confidence = clip['frame'][keep], clip['confidence'][keep]
+    if kind == 'class':
+        # A frame is flagged at a threshold if its best box reaches it
+        best = np.zeros(frame_count, dtype=np.float32)
+        np.maximum.at(best, frame, confidence)
+        return best[None, :] >= thresholds[:, None]
+    rows = np.nonzero(confidence[None, :] >= thresholds[:, None])  # (threshold, box) pairs above the threshold
+    counts = np.bincount(rows[0] * frame_count + frame[rows[1]], minlength=len(thresholds) * frame_count)
+    return counts.reshape(len(thresholds), frame_count) > min_count
+
+
+def sweep(clips, rules, thresholds, min_frames_options):
+    # Per clip, rule, threshold and min_frames: whether the clip alerts (at least
+    # min_frames flagged frames), and how many alert events (runs of flagged frames) it has
+    rows = []
+    for clip in clips:
+        hours = int(clip['frame_count']) / float(clip['fps']) / 3600.0
+        for rule in rules:
+            flagged = flagged_frames(clip, rule, thresholds)
+            flagged_count = flagged.sum(axis=1)
+            events = flagged[:, :1].sum(axis=1) + (flagged[:, 1:] & ~flagged[:, :-1]).sum(axis=1)
+            for min_frames in min_frames_options:
+                alerts = flagged_count >= min_frames
+                for threshold, alert, event_count in zip(thresholds.tolist(), alerts.tolist(), events.tolist()):
+                    rows.append({'clip': clip['path'], 'camera': clip['camera'], 'positive': clip['positive'],
+                                 'rule': rule, 'threshold': threshold, 'min_frames': min_frames, 'alert': alert,
+                                 'events': event_count if alert else 0, 'hours': hours})
+    return rows
+
+
+def curves(rows, group_key):
+    # Precision, recall and alert rate (events per hour) per group and operating point
+    groups = {}
+    for row in rows:
+        key = (row[group_key] if group_key else 'all', row['rule'], row['threshold'], row['min_frames'])
+        groups.setdefault(key, []).append(row)
+    results = []
+    for (group, rule, threshold, min_frames), members in sorted(groups.items()):
+        true_positives = sum(1 for row in members if row['alert'] and row['positive'])
+        false_positives = sum(1 for row in members if row['alert'] and not row['positive'])
+        positives = sum(1 for row in members if row['positive'])
+        hours = sum(row['hours'] for row in members)
+        results.append({
+            'group': group, 'rule': rule, 'threshold': threshold, 'min_frames': min_frames,
+            'precision': true_positives / (true_positives + false_positives) if true_positives + false_positives else None,
+            'recall': true_positives / positives if positives else None,
+            'alerts_per_hour': sum(row['events'] for row in members) / hours if hours > 0 else None,
+            'clips': len(members),
+        })
+    return results
+
+
+def write_csv(path, results):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['group', 'rule', 'threshold', 'min_frames', 'precision', 'recall',
+                                               'alerts_per_hour', 'clips'])
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate decision thresholds and rules on labelled clips")
+    parser.add_argument('--positive', nargs='+', required=True, help="Clips (files, directories or globs) with shoplifting")
+    parser.add_argument('--negative', nargs='+', required=True, help="Clips (files, directories or globs) without shoplifting")
+    parser.add_argument('--model', default='best_v2.pt', help="Trained YOLOv8 weights")
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help="Inference backend")
+    parser.add_argument('--imgsz', type=int, default=640, help="Model input size")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--rules', nargs='+', default=DEFAULT_RULES, help="Decision rules to sweep")
+    parser.add_argument('--thresholds', type=float, nargs='+', help="Confidence thresholds to sweep")
+    parser.add_argument('--min-frames', type=int, nargs='+', default=[1, 5, 15],
+                        help="Flagged frames a clip needs before it counts as an alert")
+    parser.add_argument('--output', default='evaluation', help="Directory for the result CSVs")
+    args = parser.parse_args()
+
+    for rule in args.rules:
+        parse_rule(rule)
+    # The camera is the clip's parent directory, e.g. shoplifting_videos/cam3/clip.mp4
+    labelled = [(path, True) for path in collect_videos(args.positive)] + [(path, False) for path in collect_videos(args.negative)]
+    if not labelled:
+        parser.error("No video files found")
+    cache_dir = cache_dir_for(args.model, args.backend, args.imgsz)
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_paths = {path: os.path.join(cache_dir, f"{file_content_hash(path)[:16]}.npz") for path, _ in labelled}
+
+    # Inference: only clips missing from the cache, one per worker
+    missing = [path for path, _ in labelled if not os.path.exists(cache_paths[path])]
+    start = time.perf_counter()
+    if missing:
+        if args.backend != 'torch':
+            export_model(args.model, args.backend, args.imgsz)  # Once, before the workers race to do it
+        workers = max(1, min(args.workers, len(missing)))
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        print(f"Running the model over {len(missing)} clips with {workers} workers")
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(args.model, args.backend, threads_per_worker, args.imgsz)) as executor:
+            futures = {executor.submit(infer_clip, path, cache_paths[path]): path for path in missing}
+            for future in as_completed(futures):
+                try:
+                    video_path, _, _ = future.result()
+                except Exception as exc:
+                    print(f"Failed: {futures[future]}: {exc}")
+                    continue
+                print(f"Cached: {video_path}")
+        print(f"Inference took {time.perf_counter() - start:.1f}s")
+    print(f"{len(labelled) - len(missing)} clips already cached in {cache_dir}")
+    labelled = [(path, positive) for path, positive in labelled if os.path.exists(cache_paths[path])]
+
+    # Sweep: pure NumPy over the cached outputs
+    start = time.perf_counter()
+    clips = []
+    for path, positive in labelled:
+        clip = load_clip(cache_paths[path])
+        clip.update(path=path, positive=positive, camera=os.path.basename(os.path.dirname(os.path.abspath(path))))
+        clips.append(clip)
+    thresholds = np.array(args.thresholds if args.thresholds else DEFAULT_THRESHOLDS, dtype=np.float64)
+    rows = sweep(clips, args.rules, thresholds, args.min_frames)
+
+    os.makedirs(args.output, exist_ok=True)
+    overall = curves(rows, None)
+    for name, group_key in (('overall', None), ('per_camera', 'camera'), ('per_clip', 'clip')):
+        write_csv(os.path.join(args.output, f"{name}.csv"), overall if group_key is None else curves(rows, group_key))
+    print(f"Swept {len(args.rules)} rules x {len(thresholds)} thresholds x {len(args.min_frames)} min-frames "
+          f"over {len(clips)} clips in {time.perf_counter() - start:.2f}s; results in {args.output}/")
+
+    # Best F1 operating point per rule
+    for rule in args.rules:
+        scored = [(2 * r['precision'] * r['recall'] / (r['precision'] + r['recall']), r) for r in overall
+                  if r['rule'] == rule and r['precision'] and r['recall']]
+        if scored:
+            f1, best = max(scored, key=lambda item: item[0])
+            print(f"{rule}: threshold {best['threshold']:.2f}, min frames {best['min_frames']} -> precision "
+                  f"{best['precision']:.2f}, recall {best['recall']:.2f}, F1 {f1:.2f}, "
+                  f"{best['alerts_per_hour'] or 0:.1f} alerts/hour")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+# One record per stored frame: where its JPEG bytes sit in frames.bin and which video frame it was
+INDEX_DTYPE = np.dtype([('offset', np.int64), ('length', np.int32), ('frame_number', np.int32)])
+
+# Written last, so a store with a manifest is complete
+MANIFEST_NAME = 'manifest.json'
+
+
+def dhash(frame, hash_size=8):
+    # Difference hash: hash_size**2 bits from the brightness gradients of a tiny thumbnail
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), 'big')
+
+
+class FrameDeduplicator:
+    # Keeps a frame only if its hash differs from the last kept frame's by more than
+    # max_distance bits, so a static stretch of footage keeps one frame, while slow
+    # changes still add up to a new frame eventually.
+
+    def __init__(self, max_distance=4, hash_size=8):
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.last_hash = None
+        self.skipped = 0
+
+    def keep(self, frame):
+        frame_hash = dhash(frame, self.hash_size)
+        if self.last_hash is not None and (frame_hash ^ self.last_hash).bit_count() <= self.max_distance:
+            self.skipped += 1
+            return False
+        self.last_hash = frame_hash
+        return True
+
+
+def is_complete(store_path):
+    return os.path.exists(os.path.join(store_path, MANIFEST_NAME))
+
+
+class FrameStoreWriter:
+    # Appends JPEG-encoded frames to a single frames.bin with an offset index and
+    # the YOLO boxes of every frame in one array, instead of one image file and
+    # one label file per frame.
+
+    def __init__(self, store_path, jpeg_quality=90):
+        self.store_path = store_path
+        os.makedirs(store_path, exist_ok=True)
+        self.data = open(os.path.join(store_path, 'frames.bin'), 'wb')
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.index = []
+        self.boxes = []
+        self.offset = 0
+
+    def add(self, frame_number, frame, boxes):
+        # boxes: (N, 5) rows of class, x_center, y_center, width, height (normalized)
+        ok, encoded = cv2.imencode('.jpg', frame, self.encode_params)
+        if not ok:
+            return
+        self.data.write(encoded.tobytes())
+        row = len(self.index)
+        self.index.append((self.offset, len(encoded), frame_number))
+        self.offset += len(encoded)
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 5)
+        if len(boxes):
+            self.boxes.append(np.column_stack([np.full(len(boxes), row, dtype=np.float32), boxes]))
+
+    def close(self, **manifest):
+        self.data.close()
+        np.save(os.path.join(self.store_path, 'index.npy'), np.array(self.index, dtype=INDEX_DTYPE))
+        boxes = np.concatenate(self.boxes) if self.boxes else np.zeros((0, 6), dtype=np.float32)
+        np.save(os.path.join(self.store_path, 'boxes.npy'), boxes)
+        manifest['frames'] = len(self.index)
+        manifest['bytes'] = self.offset
+        temporary = os.path.join(self.store_path, MANIFEST_NAME + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temporary, os.path.join(self.store_path, MANIFEST_NAME))
+
+
+class FrameStore:
+    # Read side: frames.bin is memory-mapped, so frames are decoded on demand straight
+    # from the page cache and a training or re-labelling run never touches the videos.
+
+    def __init__(self, store_path):
+        self.store_path = store_path
+        with open(os.path.join(store_path, MANIFEST_NAME)) as f:
+            self.manifest = json.load(f)
+        self.index = np.load(os.path.join(store_path, 'index.npy'))
+        self.boxes = np.load(os.path.join(store_path, 'boxes.npy'))
+        data_path = os.path.join(store_path, 'frames.bin')
+        self.data = np.memmap(data_path, dtype=np.uint8, mode='r') if os.path.getsize(data_path) else np.zeros(0, np.uint8)
+
+    def __len__(self):
+        return len(self.index)
+
+    def jpeg_bytes(self, i):
+        record = self.index[i]
+        return self.data[record['offset']:record['offset'] + record['length']]
+
+    def image(self, i):
+        return cv2.imdecode(np.asarray(self.jpeg_bytes(i)), cv2.IMREAD_COLOR)
+
+    def boxes_for(self, i):
+        # (N, 5) rows of class, x_center, y_center, width, height
+        rows = self.boxes[:, 0]
+        return self.boxes[np.searchsorted(rows, i, 'left'):np.searchsorted(rows, i, 'right'), 1:]
+
+    def __iter__(self):
+        # Streams (frame_number, image, boxes) in stored order
+        for i in range(len(self)):
+            yield int(self.index[i]['frame_number']), self.image(i), self.boxes_for(i)
+
+    def export_yolo(self, images_dir, labels_dir, prefix=None):
+        # Writes the stored JPEG bytes as-is (no re-encode) plus YOLO label files,
+        # for tools that need an image folder
+        prefix = prefix or self.manifest.get('video', 'frame')
+        for i in range(len(self)):
+            name = f"{prefix}_{int(self.index[i]['frame_number'])}"
+            with open(os.path.join(images_dir, name + '.jpg'), 'wb') as f:
+                f.write(self.jpeg_bytes(i).tobytes())
+            with open(os.path.join(labels_dir, name + '.txt'), 'w') as f:
+                f.writelines(f"{int(cls)} {x} {y} {w} {h}\n" for cls, x, y, w, h in self.boxes_for(i).tolist())
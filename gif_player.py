@@ -0,0 +1,110 @@
+import collections
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+# Used when a GIF frame carries no duration of its own
+DEFAULT_FRAME_MS = 100
+
+
+def frame_duration(gif_image):
+    duration = gif_image.info.get('duration') or DEFAULT_FRAME_MS
+    return max(20, int(duration))  # Browsers clamp very short delays the same way
+
+
+class GifCapture:
+    # cv2.VideoCapture-like reader for GIFs, decoding one frame at a time, so GIF
+    # evidence clips can go through the same detection pipeline as videos
+
+    def __init__(self, gif_path):
+        self.gif_path = gif_path
+        try:
+            self.image = Image.open(gif_path)
+        except OSError:
+            self.image = None
+        self.index = 0
+        self.position_ms = 0.0
+
+    def isOpened(self):
+        return self.image is not None
+
+    def read(self):
+        if self.image is None:
+            return False, None
+        try:
+            self.image.seek(self.index)
+        except EOFError:
+            return False, None
+        frame = cv2.cvtColor(np.asarray(self.image.convert('RGB')), cv2.COLOR_RGB2BGR)
+        self.position_ms += frame_duration(self.image)
+        self.index += 1
+        return True, frame
+
+    def get(self, prop):
+        if self.image is None:
+            return 0.0
+        if prop == cv2.CAP_PROP_FPS:
+            return 1000.0 / frame_duration(self.image)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.index)
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            return self.position_ms
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.image.width)
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.image.height)
+        return 0.0
+
+    def release(self):
+        if self.image is not None:
+            self.image.close()
+            self.image = None
+
+
+class GifPlayer:
+    # Plays a GIF in a Tk label, decoding frames on demand with each frame's own
+    # duration and keeping only a small LRU cache of rendered PhotoImages
+
+    def __init__(self, label, gif_path, size=None, cache_size=16):
+        self.label = label
+        self.image = Image.open(gif_path)
+        self.size = size
+        self.cache = collections.OrderedDict()
+        self.cache_size = cache_size
+        self.after_id = None
+
+    def render(self, index):
+        # Returns (PhotoImage, duration in ms) for a frame, or None past the last frame
+        if index in self.cache:
+            self.cache.move_to_end(index)
+            return self.cache[index]
+        try:
+            self.image.seek(index)
+        except EOFError:
+            return None
+        frame = self.image.convert('RGBA')
+        if self.size is not None:
+            frame.thumbnail(self.size)
+        rendered = (ImageTk.PhotoImage(frame), frame_duration(self.image))
+        self.cache[index] = rendered
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return rendered
+
+    def start(self, index=0):
+        rendered = self.render(index)
+        if rendered is None:
+            if index == 0:
+                return  # Nothing decodable
+            index, rendered = 0, self.render(0)  # Loop back to the first frame
+        photo, duration = rendered
+        self.label.configure(image=photo)
+        self.label.image = photo  # Keep a reference to avoid garbage collection
+        self.after_id = self.label.after(duration, self.start, index + 1)
+
+    def stop(self):
+        if self.after_id is not None:
+            self.label.after_cancel(self.after_id)
+            self.after_id = None
+        self.image.close()
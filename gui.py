@@ -1,18 +1,151 @@
+import time
+startup_start = time.perf_counter()  # For the startup-time measurement
+
 import tkinter as tk
 from tkinter import filedialog, Label, Entry, Button, messagebox
 import cv2
-from ultralytics import YOLO
-from PIL import Image, ImageTk
 import os
+from capture import LiveCapture, open_capture
+from clip_recorder import ClipRecorder
+from detection_store import DetectionStore
+from display import FrameDisplay, render_for_display
+from gif_player import GifPlayer
+from metrics import metrics, serve_metrics
+from model_loader import get_model_handle
+from motion import load_motion_settings, motion_gate_for
+from pipeline import FramePipeline, is_live_source
+from quality import QualityController
+from postprocess import Detections, annotate, class_ids_for, extract_detections
+from roi import load_roi_settings, region_inference_for
+from shm_transport import ShmCapture
+from tracker import IoUTracker
+from video_writer import segment_prefix
+
+# Inference backend: 'torch', or 'onnx'/'openvino' to run an exported copy on CPU
+model_backend = 'torch'
+model_threads = None  # Inference threads; None keeps the runtime default
+model_imgsz = 640  # Model input size
 
-# Load the trained YOLOv8 model
-model = YOLO('best_v2.pt')  # Load your trained model
+# The trained YOLOv8 model, loaded on a background thread (exported and warmed up once for the
+# chosen backend) as soon as the app starts; see __main__. Decoder processes re-import this
+# module, so nothing heavy happens at import time.
+model = None
 
 # Create a directory to save the frames if it doesn't exist
 output_dir = 'tested'
 if not os.path.exists(output_dir):
     os.makedirs(output_dir)
 
+# Optional per-camera motion gating (see motion.json)
+motion_settings = load_motion_settings()
+
+# Optional per-camera regions of interest and tiling (see roi.json)
+roi_settings = load_roi_settings()
+
+# Run the detector every N frames to start with; the tracker carries boxes across the frames in between
+detect_every = 3
+track_confidence = 0.25  # Boxes above this start or extend a track
+alert_confidence = 0.52  # Mean confidence a confirmed track needs to be flagged
+
+# Every frame's tracked detections are stored here for querying (see detection_store.py)
+detection_db = os.path.join(output_dir, 'detections.db')
+
+# Pre/post-event clips around every shoplift alert
+clips_dir = os.path.join(output_dir, 'clips')
+
+# Video area size and the most often it is redrawn; inference runs at its own rate
+display_size = (600, 400)
+display_max_fps = 30
+
+# Adaptive quality: to hold target_fps and latency_budget (seconds from decode to result) under
+# load, the detector stride, model input size and display rate are lowered within these bounds
+target_fps = 10
+latency_budget = 0.3
+quality_imgsz_choices = (320, 416, 512, 640)
+quality_stride_bounds = (1, 6)
+quality_display_fps_bounds = (10, display_max_fps)
+
+# Decode in a separate process and hand frames to inference through shared memory,
+# so decoding and inference use different cores instead of sharing one GIL
+shm_decode = False
+
+# Serve Prometheus metrics at http://127.0.0.1:<port>/metrics; None leaves instrumentation off
+metrics_port = None
+
+class SourceSession:
+    # Detection state of one source. Only that source's pipeline worker touches it, so a
+    # worker that outlives its source (e.g. still waiting for the model to load) can never
+    # mix its frames into the next source's tracker, recorders or quality controller.
+
+    def __init__(self, app, video_source, cap):
+        self.app = app
+        self.stream_name = segment_prefix(video_source)  # Output file names and metrics
+        self.source_id = str(video_source)  # Stable camera id in the detection store
+        self.motion_gate = motion_gate_for(video_source, motion_settings)
+        self.regions = region_inference_for(video_source, roi_settings)
+        self.tracker = IoUTracker()
+        self.shoplift_ids = None
+        self.clip_recorder = ClipRecorder(clips_dir, prefix=self.stream_name, fps=cap.get(cv2.CAP_PROP_FPS))
+        self.detection_store = DetectionStore(detection_db)
+        self.quality = QualityController(target_fps=target_fps, latency_budget=latency_budget,
+                                         imgsz_choices=quality_imgsz_choices, imgsz=model_imgsz, stride=detect_every,
+                                         stride_bounds=quality_stride_bounds, display_fps=display_max_fps,
+                                         display_fps_bounds=quality_display_fps_bounds, name=self.stream_name)
+        self.frame_index = 0
+        self.scene_static = False  # The motion gate rejected the last detector frame
+
+    def detect_frame(self, frame):
+        # Runs on the pipeline's inference worker, never on the Tk main thread
+        # The detector runs every quality.stride frames, at the controller's current
+        # input size and only on motion; the tracker propagates the boxes in between,
+        # or holds them in place while the scene is static
+        if self.shoplift_ids is None:
+            self.shoplift_ids = class_ids_for(model.names, ['shoplift'])  # Waits for the model on first use
+        quality = self.quality.settings()
+        detector_frame = self.frame_index % quality['stride'] == 0
+        if detector_frame:
+            self.scene_static = self.motion_gate is not None and not self.motion_gate.should_infer(frame)
+        if detector_frame and not self.scene_static:
+            with metrics.timer('infer', self.stream_name):
+                if self.regions is not None:
+                    # Only the regions of interest go through the model, in one batch
+                    candidates = self.regions.detect(model, frame, class_ids=self.shoplift_ids, min_confidence=track_confidence,
+                                                     imgsz=quality['imgsz'])
+                else:
+                    results = model(frame, verbose=False, imgsz=quality['imgsz'])
+                    candidates = extract_detections(results[0], class_ids=self.shoplift_ids, min_confidence=track_confidence)
+            self.tracker.update(candidates.xyxy, candidates.confidence, candidates.class_id)
+            # The model's own boxes and confidences are stored, tagged with their track, so
+            # a confidence filter means the same here as for the other entry points
+            self.detection_store.add(self.source_id, self.frame_index,
+                                     Detections(candidates.xyxy, candidates.confidence, candidates.class_id,
+                                                self.tracker.detection_track_ids), model.names)
+        elif self.scene_static:
+            self.tracker.hold()  # Reuse the last boxes as they are until something moves
+        else:
+            self.tracker.predict()
+        self.frame_index += 1
+
+        # Flag tracks on their evidence over several detector runs, not a single box
+        alerts = Detections.from_tracks([track for track in self.tracker.confirmed_tracks()
+                                         if track.score() > alert_confidence])
+
+        def draw_alerts(clip_frame, scale):
+            annotate(clip_frame, alerts.scaled(scale, scale), model.names, color=(0, 0, 255))
+
+        # Buffer the frame; an alert flushes the surrounding footage to a clip
+        self.clip_recorder.add(frame, self.frame_index, triggered=len(alerts) > 0,
+                               overlay=draw_alerts if len(alerts) else None)
+
+        # Shrink first, then convert and draw at display size; red color for 'shoplift'
+        lines = metrics.summary(self.stream_name) + [self.quality.describe()] if self.app.show_stats else ()
+        return render_for_display(frame, detections=alerts, names=model.names, color=(0, 0, 255), lines=lines)
+
+    def close(self):
+        self.clip_recorder.close()
+        self.detection_store.close()
+
+
 class VideoApp:
 
     def __init__(self, master):
@@ -23,6 +156,7 @@ class VideoApp:
         # Bind Esc key to exit full screen
         self.master.bind("<Escape>", self.toggle_fullscreen)
         self.master.bind("q", self.quit_app)  # Bind 'q' key to quit the application
+        self.master.bind("<F2>", self.toggle_stats)  # Bind F2 to the on-screen stats overlay
         self.master.geometry("800x600")  # Set the initial size of the window
         self.master.configure(bg="#f0f0f0")  # Set a background color
 
@@ -44,63 +178,94 @@ class VideoApp:
         upload_button = Button(master, text="Upload Video/GIF", command=self.upload_file, font=("Helvetica", 12), bg="#2196F3", fg="white", padx=10, pady=5)
         upload_button.pack(pady=10)
 
+        # Model loading state
+        self.status_label = Label(master, text=model.status(), font=("Helvetica", 12), bg="#f0f0f0")
+        self.status_label.pack()
+        self.poll_model()
+
         # Label to display video frames
         self.video_label = Label(master)
         self.video_label.pack()
+        self.display = FrameDisplay(self.video_label, size=display_size)
+
+        # Decode/inference pipeline and detection state of the current source
+        self.pipeline = None
+        self.session = None
+        self.show_stats = False
 
     def toggle_fullscreen(self, event=None):
         is_fullscreen = self.master.attributes('-fullscreen')
         self.master.attributes('-fullscreen', not is_fullscreen)
 
+    def poll_model(self):
+        self.status_label.configure(text=model.status())
+        if not model.loaded.is_set():
+            self.master.after(200, self.poll_model)
+        elif model.error is None:
+            print(f"Model ready {time.perf_counter() - startup_start:.2f}s after startup")
+
+    def toggle_stats(self, event=None):
+        self.show_stats = not self.show_stats
+        if self.show_stats:
+            metrics.enabled = True  # The overlay needs the timers running
+
     def upload_file(self):
         # Open file dialog to upload a video or GIF
         file_path = filedialog.askopenfilename(filetypes=[("Video/GIF files", "*.mp4;*.avi;*.gif;*.mkv")])
         if file_path:
             if file_path.lower().endswith('.gif'):
                 self.display_gif(file_path)
-            else:
-                self.process_video(file_path)
+            self.process_video(file_path)  # GIFs go through the same detection pipeline as videos
 
     def process_video(self, video_source):
-        cap = cv2.VideoCapture(video_source)
+        cap = ShmCapture(video_source) if shm_decode else open_capture(video_source)
         if not cap.isOpened():
             messagebox.showerror("Error", "Unable to open video source: " + video_source)
             return
-        self.update_frame(cap)
-
-    def update_frame(self, cap):
-        ret, frame = cap.read()
-        if ret:
-            # Make predictions using the YOLO model
-            results = model(frame, verbose=False)
-            for result in results:
-                for box in result.boxes:
-                    confidence = box.conf[0]  # Get the confidence score
-                    if confidence > 0.52:  # Only process boxes with confidence > 0.50
-                        class_id = int(box.cls[0])
-                        class_name = model.names[class_id]
-
-                        if class_name == 'shoplift':
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])  # Get coordinates of the box
-                            box_color = (0, 0, 255)  # Red color for 'shoplift'
-                            text_color = (0, 0, 255)
-                            box_thickness = 10
-                            cv2.rectangle(frame, (x1, y1), (x2, y2), box_color, box_thickness)
-                            label = f"{class_name} {confidence:.2f}"
-                            font_scale = 3.0
-                            text_thickness = 3
-                            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, font_scale, text_color, text_thickness)
-
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.resize(frame, (600, 400))
-            img = Image.fromarray(frame)
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.video_label.imgtk = imgtk  # Keep a reference to avoid garbage collection
-            self.video_label.configure(image=imgtk)
-
-            self.video_label.after(10, self.update_frame, cap)  # Update frame every 10 ms
+        self.stop_source()
+        self.session = SourceSession(self, video_source, cap)
+        # Decoding and inference run off the Tk thread; the UI only pulls finished frames.
+        # Shared-memory and live captures already decode on their own and keep the newest
+        # frame, so the worker reads them directly rather than through a second queue.
+        self.pipeline = FramePipeline(cap, self.session.detect_frame, live=is_live_source(video_source),
+                                      name=self.session.stream_name, on_latency=self.session.quality.record,
+                                      decode_thread=not isinstance(cap, (ShmCapture, LiveCapture))).start()
+        self.update_frame(self.pipeline, self.session)
+
+    def update_frame(self, pipeline, session):
+        if pipeline is not self.pipeline:
+            return  # A newer source replaced this one
+        # Only the newest finished frame is drawn, at the display rate the quality controller allows
+        frame = pipeline.get_latest()
+        if frame is not None:
+            self.display.show(frame)
+
+        if pipeline.done:
+            self.stop_source()
+            if pipeline.error is not None:
+                messagebox.showerror("Error", f"Detection failed: {pipeline.error}")
+            return
+        self.video_label.after(session.quality.display_interval_ms(), self.update_frame, pipeline, session)
+
+    def stop_source(self, wait=False):
+        # Stops decoding/inference and writes out any clip still being recorded
+        if self.pipeline is None:
+            return
+        self.pipeline.stop()
+        if wait:
+            self.session.close()
         else:
-            cap.release()
+            self.close_when_idle(self.pipeline, self.session)
+        self.pipeline = None
+        self.session = None
+
+    def close_when_idle(self, pipeline, session):
+        # The worker may still be inside a model call (e.g. waiting for the model to
+        # load); the source's recorders are only closed once it has exited
+        if pipeline.infer_thread.is_alive():
+            self.master.after(200, self.close_when_idle, pipeline, session)
+            return
+        session.close()
 
     def process_rtsp(self):
         rtsp_url = self.rtsp_entry.get()
@@ -112,29 +277,21 @@ class VideoApp:
         gif_window.title("GIF Viewer")
         gif_window.geometry("600x400")
 
-        gif_image = Image.open(gif_path)
-        frames = []
-
-        try:
-            while True:
-                frame = ImageTk.PhotoImage(gif_image.copy())
-                frames.append(frame)
-                gif_image.seek(len(frames))  # Load next frame
-        except EOFError:
-            pass
-
         gif_label = Label(gif_window)
         gif_label.pack(fill="both", expand=True)
 
-        def update_gif(index):
-            frame = frames[index]
-            gif_label.configure(image=frame)
-            index = (index + 1) % len(frames)
-            gif_window.after(100, update_gif, index)  # 100 ms delay between frames
+        # Frames are decoded on demand and shown for their own duration
+        player = GifPlayer(gif_label, gif_path, size=(600, 400))
+
+        def close_gif():
+            player.stop()
+            gif_window.destroy()
 
-        update_gif(0)  # Start displaying the first frame
+        gif_window.protocol("WM_DELETE_WINDOW", close_gif)
+        player.start()  # Start displaying the first frame
 
     def quit_app(self, event=None):
+        self.stop_source(wait=True)
         self.master.quit()
 
 
@@ -142,6 +299,14 @@ class VideoApp:
 ## Updated code.........======eeeee------======
 
 # Create the main window
-root = tk.Tk()
-app = VideoApp(root)
-root.mainloop()
+if __name__ == '__main__':
+    # Start loading the model before the window is built; the window is usable right away
+    # and inference waits until it is ready
+    model = get_model_handle('best_v2.pt', backend=model_backend, threads=model_threads, imgsz=model_imgsz)
+    if metrics_port is not None:
+        metrics.enabled = True
+        serve_metrics(metrics, metrics_port)
+    root = tk.Tk()
+    app = VideoApp(root)
+    root.after_idle(lambda: print(f"UI ready {time.perf_counter() - startup_start:.2f}s after startup"))
+    root.mainloop()
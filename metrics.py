@@ -0,0 +1,186 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+HISTOGRAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class NullTimer:
+    # Stands in for StageTimer while metrics are disabled
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class StageTimer:
+
+    def __init__(self, metrics, stage, stream):
+        self.metrics = metrics
+        self.stage = stage
+        self.stream = stream
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe_stage(self.stage, time.perf_counter() - self.start, self.stream)
+        return False
+
+
+class Histogram:
+
+    def __init__(self):
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+class Metrics:
+    # Per-stream stage timers, counters, gauges and histograms. Every call returns
+    # immediately while disabled, so the instrumentation can stay in the hot loops.
+
+    def __init__(self, enabled=False, smoothing=0.9):
+        self.enabled = enabled
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.recent = {}  # (stream, stage) -> smoothed seconds, for the on-screen overlay
+        self.last_frame = {}
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def timer(self, stage, stream='default'):
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, stage, stream)
+
+    def observe_stage(self, stage, seconds, stream='default'):
+        if not self.enabled:
+            return
+        stream = str(stream)
+        key = ('shoplift_stage_seconds', (('stage', stage), ('stream', stream)))
+        with self.lock:
+            self.histograms.setdefault(key, Histogram()).observe(seconds)
+            previous = self.recent.get((stream, stage))
+            self.recent[(stream, stage)] = seconds if previous is None else (
+                self.smoothing * previous + (1.0 - self.smoothing) * seconds)
+
+    def frame_done(self, stream='default'):
+        # Counts a finished frame and updates the smoothed per-stream FPS
+        if not self.enabled:
+            return
+        stream = str(stream)
+        now = time.perf_counter()
+        self.inc('shoplift_frames_total', stream=stream)
+        with self.lock:
+            last = self.last_frame.get(stream)
+            self.last_frame[stream] = now
+        if last is not None and now > last:
+            previous = self.gauges.get(('shoplift_fps', (('stream', stream),)))
+            fps = 1.0 / (now - last)
+            self.set('shoplift_fps', fps if previous is None else self.smoothing * previous + (1.0 - self.smoothing) * fps,
+                     stream=stream)
+
+    def summary(self, stream='default'):
+        # Lines for the on-screen stats overlay
+        stream = str(stream)
+        with self.lock:
+            fps = self.gauges.get(('shoplift_fps', (('stream', stream),)), 0.0)
+            dropped = self.counters.get(('shoplift_dropped_frames_total', (('stream', stream),)), 0)
+            stages = sorted((stage, seconds) for (stage_stream, stage), seconds in self.recent.items() if stage_stream == stream)
+            staleness = self.gauges.get(('shoplift_frame_staleness_seconds', (('stream', stream),)))
+            reconnects = self.counters.get(('shoplift_reconnects_total', (('stream', stream),)), 0)
+        lines = [f"FPS {fps:.1f}  dropped {dropped}"]
+        if staleness is not None:  # Live sources only
+            lines.append(f"stale {staleness * 1000:.0f} ms  reconnects {reconnects}")
+        lines.extend(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in stages)
+        return lines
+
+    def render(self):
+        # Prometheus text exposition format
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+            return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+        lines = []
+        with self.lock:
+            for kind, values in (('counter', self.counters), ('gauge', self.gauges)):
+                seen = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in seen:
+                        lines.append(f"# TYPE {name} {kind}")
+                        seen.add(name)
+                    lines.append(f"{name}{label_text(labels)} {value}")
+            seen = set()
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                cumulative = 0
+                for bound, count in zip(HISTOGRAM_BUCKETS, histogram.buckets):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{label_text(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def serve_metrics(metrics, port, host='127.0.0.1'):
+    # Serves metrics.render() at /metrics from a daemon thread
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrapes out of the console
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# Shared registry; entry points enable it and start the endpoint when configured
+metrics = Metrics()
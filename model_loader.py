@@ -0,0 +1,71 @@
+import threading
+import time
+
+# Handles already created in this process, so every window and pipeline shares one warmed model
+loaded_handles = {}
+
+
+class ModelHandle:
+    # Loads (exports, warms up) the model on a background thread so the UI can come
+    # up immediately. Calling the handle or reading .names waits until it is ready,
+    # so it can be used wherever a YOLO model is expected.
+
+    def __init__(self, weights, backend='torch', threads=None, imgsz=640):
+        self.weights = weights
+        self.backend = backend
+        self.threads = threads
+        self.imgsz = imgsz
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self.loaded = threading.Event()
+        self.thread = threading.Thread(target=self._load, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            # torch/ultralytics are only imported here, off the startup path
+            from backends import load_model
+
+            self.model = load_model(self.weights, backend=self.backend, threads=self.threads, imgsz=self.imgsz)
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self.loaded.set()
+
+    def is_ready(self):
+        return self.loaded.is_set() and self.error is None
+
+    def status(self):
+        if not self.loaded.is_set():
+            return "Model loading..."
+        if self.error is not None:
+            return f"Model failed to load: {self.error}"
+        return f"Model ready ({self.backend}, {self.load_seconds:.1f}s)"
+
+    def wait(self, timeout=None):
+        if not self.loaded.wait(timeout):
+            raise TimeoutError(f"Model {self.weights} is still loading")
+        if self.error is not None:
+            raise RuntimeError(f"Model {self.weights} failed to load: {self.error}")
+        return self.model
+
+    def __call__(self, *args, **kwargs):
+        return self.wait()(*args, **kwargs)
+
+    @property
+    def names(self):
+        return self.wait().names
+
+
+def get_model_handle(weights, backend='torch', threads=None, imgsz=640):
+    # Starts loading on first use; later calls get the same (possibly already warmed) handle
+    key = (weights, backend, threads, imgsz)
+    if key not in loaded_handles:
+        loaded_handles[key] = ModelHandle(weights, backend, threads, imgsz).start()
+    return loaded_handles[key]
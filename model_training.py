@@ -1,12 +1,31 @@
+import multiprocessing
 import os
+import queue
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import cv2
+import numpy as np
 import torch
 from sklearn.model_selection import train_test_split
 from ultralytics import YOLO
 
-# Load the pre-trained YOLOv8 model on GPU
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-model = YOLO('yolov8n.pt').to(device)
+from backends import file_content_hash
+from frame_store import FrameDeduplicator, FrameStore, FrameStoreWriter, is_complete
+
+# Extracted frames and labels are kept here per video as a compact frame store (see
+# frame_store.py), keyed on the file content hash, so re-running training skips videos
+# that were already extracted
+extraction_cache_dir = os.path.join(os.getcwd(), 'extraction_cache')
+
+# Model used to find boxes while extracting frames; loaded once per worker process
+extract_model = None
+
+# Every extraction worker on a GPU holds its own CUDA context and model copy, so
+# their number is capped there instead of following the CPU core count
+max_gpu_extract_workers = 2
+
 
 def get_all_video_files(folder):
     video_files = []
@@ -16,19 +35,96 @@ def get_all_video_files(folder):
                 video_files.append(os.path.join(root, file))
     return video_files
 
-def process_and_train(shoplifting_folder, normal_folder, output_model_path):
-    # Load the pre-trained YOLOv8 model on GPU
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model = YOLO('yolov8n.pt').to(device)
-
-    def get_all_video_files(folder):
-        video_files = []
-        for root, _, files in os.walk(folder):
-            for file in files:
-                if file.endswith('.mp4'):
-                    video_files.append(os.path.join(root, file))
-        return video_files
 
+def init_extract_worker(model_path, threads_per_worker):
+    global extract_model
+    torch.set_num_threads(threads_per_worker)
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    extract_model = YOLO(model_path).to(device)
+
+
+def write_loop(pending, store):
+    # Background writer: encodes and appends frames so decoding and inference never wait on disk
+    while True:
+        item = pending.get()
+        if item is None:
+            break
+        store.add(*item)
+
+
+def extract_video(video_path, label, frame_stride=1, batch_size=16, conf_threshold=0.5, dedup_distance=4):
+    # Runs in a worker process: extracts the kept frames of one video into its cache entry.
+    # Frames within dedup_distance hash bits of the last kept frame are dropped before
+    # inference; None keeps every frame.
+    class_id = 0 if label == 'normal' else 1
+    cache_key = f"{file_content_hash(video_path)}_{label}_s{frame_stride}_c{conf_threshold}_d{dedup_distance}"
+    cache_path = os.path.join(extraction_cache_dir, cache_key)
+    if is_complete(cache_path):
+        return video_path, cache_path, True
+
+    shutil.rmtree(cache_path, ignore_errors=True)  # Leftovers from an interrupted run
+    store = FrameStoreWriter(cache_path)
+    dedup = FrameDeduplicator(dedup_distance) if dedup_distance is not None else None
+
+    pending = queue.Queue(maxsize=4 * batch_size)
+    writer = threading.Thread(target=write_loop, args=(pending, store), daemon=True)
+    writer.start()
+
+    def flush(batch):
+        # Batched inference over the collected frames
+        results = extract_model([frame for _, frame in batch], imgsz=640, verbose=False)
+        for (frame_number, frame_resized), result in zip(batch, results):
+            boxes = result.boxes.data.cpu().numpy()  # x1, y1, x2, y2, conf, cls
+            boxes = boxes[boxes[:, 4] > conf_threshold]  # Confidence threshold
+            # Skip frame if no detections
+            if len(boxes) == 0:
+                continue
+
+            # YOLO format: class x_center y_center width height
+            img_height, img_width, _ = frame_resized.shape
+            x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+            yolo_boxes = np.column_stack([np.full(len(boxes), class_id), (x1 + x2) / 2 / img_width,
+                                          (y1 + y2) / 2 / img_height, (x2 - x1) / img_width, (y2 - y1) / img_height])
+            pending.put((frame_number, frame_resized, yolo_boxes))
+
+    cap = cv2.VideoCapture(video_path)
+    batch = []
+    frame_number = 0
+    frames_read = 0
+    while cap.isOpened():
+        # Frames between strides are only grabbed, never decoded
+        if frame_number % frame_stride != 0:
+            if not cap.grab():
+                break
+            frame_number += 1
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_number += 1
+        frames_read += 1
+        if dedup is not None and not dedup.keep(frame):
+            continue  # Near-identical to the last kept frame
+
+        # Resize frame to 640x640
+        batch.append((frame_number, cv2.resize(frame, (640, 640))))
+        if len(batch) == batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    cap.release()
+
+    pending.put(None)
+    writer.join()
+    store.close(video=os.path.basename(video_path), label=label, frame_stride=frame_stride,
+                conf_threshold=conf_threshold, dedup_distance=dedup_distance, frames_read=frames_read,
+                duplicates_skipped=dedup.skipped if dedup is not None else 0)
+    return video_path, cache_path, False
+
+
+def process_and_train(shoplifting_folder, normal_folder, output_model_path, frame_stride=1, batch_size=16, workers=None,
+                      dedup_distance=4):
     video_paths = []
     labels = []
 
@@ -59,60 +155,32 @@ def process_and_train(shoplifting_folder, normal_folder, output_model_path):
 
     print(f"Temporary dataset path: {temp_dataset_path}")
 
-    def process_videos(video_paths, labels, split):
-        for video_path, label in zip(video_paths, labels):
-            cap = cv2.VideoCapture(video_path)
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Resize frame to 640x640
-                frame_resized = cv2.resize(frame, (640, 640))
-                
-                # Convert frame to tensor and add batch dimension
-                frame_tensor = torch.from_numpy(frame_resized).permute(2, 0, 1).unsqueeze(0).to(device).float()  # BCHW format
-                
-                # Get bounding box coordinates from YOLOv8 model
-                results = model(frame_tensor)
-                boxes = results[0].boxes.xyxy.cpu().numpy()  # Bounding boxes
-                
-                # Skip frame if no detections
-                if len(boxes) == 0:
-                    continue
-                
-                # Prepare data for training
-                for box in boxes:
-                    x1, y1, x2, y2 = box[:4]
-                    conf = box[4] if len(box) > 4 else 1.0  # Default confidence to 1.0 if not provided
-                    cls = box[5] if len(box) > 5 else 0  # Default class to 0 if not provided
-                    if conf > 0.5:  # Confidence threshold
-                        # Save frame and bounding box to temporary files
-                        img_name = f"{os.path.basename(video_path)}_{int(cap.get(cv2.CAP_PROP_POS_FRAMES))}.jpg"
-                        img_path = os.path.join(temp_dataset_path, split, 'images', img_name)
-                        label_path = os.path.join(temp_dataset_path, split, 'labels', img_name.replace('.jpg', '.txt'))
-                        
-                        cv2.imwrite(img_path, frame_resized)
-                        print(f"Saved image to: {img_path}")
-                        
-                        with open(label_path, 'w') as f:
-                            # YOLO format: class x_center y_center width height
-                            class_id = 0 if label == 'normal' else 1
-                            img_height, img_width, _ = frame_resized.shape
-                            x_center = (x1 + x2) / 2 / img_width
-                            y_center = (y1 + y2) / 2 / img_height
-                            width = (x2 - x1) / img_width
-                            height = (y2 - y1) / img_height
-                            f.write(f"{class_id} {x_center} {y_center} {width} {height}\n")
-                        print(f"Saved label to: {label_path}")
-                        
-            cap.release()
-
-    # Process training, validation, and test videos
-    process_videos(train_paths, train_labels, 'train')
-    process_videos(val_paths, val_labels, 'val')
-    process_videos(test_paths, test_labels, 'test')
-    cv2.destroyAllWindows()
+    # Extract frames in parallel, one video per worker process
+    splits = [('train', train_paths, train_labels), ('val', val_paths, val_labels), ('test', test_paths, test_labels)]
+    jobs = [(video_path, label, split) for split, paths, split_labels in splits for video_path, label in zip(paths, split_labels)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    if torch.cuda.is_available():  # Only queries the driver; no CUDA context in the parent
+        workers = min(workers, max_gpu_extract_workers)
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    os.makedirs(extraction_cache_dir, exist_ok=True)
+
+    # spawn: forked workers cannot use CUDA once the parent process has touched it
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_extract_worker,
+                             initargs=('yolov8n.pt', threads_per_worker),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {executor.submit(extract_video, video_path, label, frame_stride, batch_size,
+                                   dedup_distance=dedup_distance): split
+                   for video_path, label, split in jobs}
+        for future in as_completed(futures):
+            split = futures[future]
+            video_path, cache_path, cached = future.result()
+            store = FrameStore(cache_path)
+            print(f"{'Cached' if cached else 'Extracted'}: {video_path} ({len(store)} frames kept, "
+                  f"{store.manifest['duplicates_skipped']} near-duplicates dropped)")
+
+            # The trainer reads image folders, so write the stored JPEGs into the split as-is
+            store.export_yolo(os.path.join(temp_dataset_path, split, 'images'),
+                              os.path.join(temp_dataset_path, split, 'labels'))
 
     # Create dataset configuration file
     dataset_config = f"""
@@ -130,24 +198,27 @@ def process_and_train(shoplifting_folder, normal_folder, output_model_path):
     print(f"Created dataset.yaml at: {dataset_yaml_path}")
     print(f"Dataset config:\n{dataset_config}")
 
+    # Load the pre-trained YOLOv8 model on GPU, only now that the extraction workers are gone
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    model = YOLO('yolov8n.pt').to(device)
+
     # Train the model for 1 epoch and save the best model based on validation performance
     model.train(data=dataset_yaml_path, epochs=1, imgsz=640, save_period=1, device=device)
 
     print(f"Training completed. Model saved to: {output_model_path}")
 
-    # Clean up temporary files
-    import shutil
+    # Clean up the temporary split directories; the extraction cache is kept for the next run
     shutil.rmtree(temp_dataset_path)
     print(f"Removed temporary dataset directory: {temp_dataset_path}")
 
-# Example usage
-shoplifting_folder = 'shoplifting_videos'
-normal_folder = 'normal_videos'
-output_model_path = 'best_model_v8.pt'
-
-#----------------
 
-print(f"Current working directory: {os.getcwd()}")
-process_and_train(shoplifting_folder, normal_folder, output_model_path)
+if __name__ == '__main__':
+    # Example usage
+    shoplifting_folder = 'shoplifting_videos'
+    normal_folder = 'normal_videos'
+    output_model_path = 'best_model_v8.pt'
 
+    #----------------
 
+    print(f"Current working directory: {os.getcwd()}")
+    process_and_train(shoplifting_folder, normal_folder, output_model_path)
@@ -0,0 +1,90 @@
+import json
+import os
+import time
+
+import cv2
+
+# Per-camera motion settings live here; without this file motion gating is off
+MOTION_CONFIG_PATH = 'motion.json'
+
+DEFAULT_MOTION_SETTINGS = {
+    'method': 'diff',         # 'diff' (frame differencing) or 'mog2' (background subtraction)
+    'threshold': 0.01,        # Fraction of changed pixels that counts as motion
+    'pixel_delta': 25,        # Grey-level change for a pixel to count as changed ('diff' only)
+    'max_stale': 2.0,         # Seconds after which the model runs even without motion
+    'downscale_width': 160,   # Width of the thumbnail the check runs on
+}
+
+
+class MotionGate:
+    # Cheap pre-filter in front of the model: compares a small, blurred grey
+    # thumbnail of each frame with the previous one and only lets the frame
+    # through when enough of it changed or the last inference is too old.
+
+    def __init__(self, method='diff', threshold=0.01, pixel_delta=25, max_stale=2.0, downscale_width=160):
+        if method not in ('diff', 'mog2'):
+            raise ValueError(f"Unknown motion method: {method}")
+        self.method = method
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.max_stale = max_stale
+        self.downscale_width = downscale_width
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == 'mog2' else None
+        self.previous = None
+        self.last_inference = None
+        self.motion_level = 0.0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.downscale_width / float(width)
+        small = cv2.resize(frame, (self.downscale_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def _changed_fraction(self, small):
+        if self.subtractor is not None:
+            mask = self.subtractor.apply(small)
+            return cv2.countNonZero(mask) / float(mask.size)
+        if self.previous is None or self.previous.shape != small.shape:
+            return 1.0
+        diff = cv2.absdiff(small, self.previous)
+        return cv2.countNonZero(cv2.threshold(diff, self.pixel_delta, 255, cv2.THRESH_BINARY)[1]) / float(diff.size)
+
+    def should_infer(self, frame):
+        # True when the full model should run on this frame
+        small = self._thumbnail(frame)
+        self.motion_level = self._changed_fraction(small)
+        self.previous = small
+        self.frames_seen += 1
+
+        now = time.monotonic()
+        stale = self.last_inference is None or now - self.last_inference >= self.max_stale
+        if stale or self.motion_level >= self.threshold:
+            self.last_inference = now
+            return True
+        self.frames_skipped += 1
+        return False
+
+
+def load_motion_settings(config_path=MOTION_CONFIG_PATH):
+    # {"default": {...}, "sources": {"rtsp://cam3/stream": {"threshold": 0.02}, ...}}
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path) as f:
+        return json.load(f)
+
+
+def motion_gate_for(video_source, motion_settings):
+    # Builds the gate for one camera, or None when motion gating is disabled
+    if motion_settings is None:
+        return None
+    settings = dict(DEFAULT_MOTION_SETTINGS)
+    settings.update(motion_settings.get('default', {}))
+    source_settings = motion_settings.get('sources', {}).get(str(video_source))
+    if source_settings is False:
+        return None  # Gating explicitly switched off for this camera
+    settings.update(source_settings or {})
+    return MotionGate(**settings)
@@ -0,0 +1,179 @@
+import argparse
+import collections
+import queue
+import threading
+import time
+
+import cv2
+
+from backends import BACKENDS, load_model
+from capture import open_capture
+from metrics import metrics
+from pipeline import is_live_source, put_latest
+
+
+class CameraStream:
+    # Reads one source on its own thread and hands the engine one frame at a time.
+    # Live sources keep only the newest frame; files wait until their frame is taken.
+
+    def __init__(self, stream_id, video_source, fps_window=30):
+        self.stream_id = stream_id
+        self.video_source = video_source
+        self.live = is_live_source(video_source)
+        self.cap = open_capture(video_source, name=stream_id)  # Live sources reconnect on their own
+        self.slot = queue.Queue(maxsize=1)
+        self.stop_event = threading.Event()
+        self.ended = False
+        self.frames_done = 0
+        self.result_times = collections.deque(maxlen=fps_window)
+        self.thread = threading.Thread(target=self._grab_loop, daemon=True)
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _grab_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                if self.live:
+                    if put_latest(self.slot, frame):
+                        metrics.inc('shoplift_dropped_frames_total', stream=str(self.stream_id))
+                    continue
+                while not self.stop_event.is_set():
+                    try:
+                        self.slot.put(frame, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+        finally:
+            self.cap.release()
+            self.ended = True
+
+    def take(self):
+        # Latest unprocessed frame, or None if nothing new arrived since the last tick
+        try:
+            return self.slot.get_nowait()
+        except queue.Empty:
+            return None
+
+    def finished(self):
+        return self.ended and self.slot.empty()
+
+    def record_result(self):
+        self.frames_done += 1
+        self.result_times.append(time.perf_counter())
+        metrics.frame_done(self.stream_id)
+
+    def fps(self):
+        if len(self.result_times) < 2:
+            return 0.0
+        elapsed = self.result_times[-1] - self.result_times[0]
+        return (len(self.result_times) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def stop(self):
+        self.stop_event.set()
+        if getattr(self.cap, 'release_wakes_reader', False):
+            self.cap.release()  # Wakes a read() waiting through a reconnect
+        if self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+
+
+class MultiCameraEngine:
+    # Shares one YOLO model across N sources: every tick the newest frame of each
+    # stream goes into a single batched model([...]) call and each Results object
+    # is handed back to the stream it came from.
+
+    def __init__(self, model, video_sources, on_result=None, idle_sleep=0.005):
+        self.model = model
+        self.streams = [CameraStream(stream_id, source) for stream_id, source in enumerate(video_sources)]
+        self.on_result = on_result  # Called as on_result(stream_id, frame, result)
+        self.idle_sleep = idle_sleep
+        self.stop_event = threading.Event()
+
+    def start(self):
+        for stream in self.streams:
+            if not stream.is_opened():
+                raise IOError(f"Unable to open video source: {stream.video_source}")
+        for stream in self.streams:
+            stream.start()
+        return self
+
+    def step(self):
+        # One batched forward pass over every stream that has a new frame
+        batch = []
+        for stream in self.streams:
+            frame = stream.take()
+            if frame is not None:
+                batch.append((stream, frame))
+        if not batch:
+            return 0
+
+        with metrics.timer('infer_batch', 'all'):
+            results = self.model([frame for _, frame in batch], verbose=False)
+        for (stream, frame), result in zip(batch, results):
+            stream.record_result()
+            if self.on_result is not None:
+                self.on_result(stream.stream_id, frame, result)
+        return len(batch)
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if all(stream.finished() for stream in self.streams):
+                    break
+                if self.step() == 0:
+                    time.sleep(self.idle_sleep)
+        finally:
+            self.stop()
+
+    def fps(self):
+        return {stream.stream_id: stream.fps() for stream in self.streams}
+
+    def stop(self):
+        self.stop_event.set()
+        for stream in self.streams:
+            stream.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one shared YOLO model over several video sources")
+    parser.add_argument('sources', nargs='+', help="Video files, RTSP URLs or camera indices")
+    parser.add_argument('--model', default='best_v2.pt', help="Trained YOLOv8 weights")
+    parser.add_argument('--backend', choices=BACKENDS, default='torch', help="Inference backend")
+    parser.add_argument('--threads', type=int, help="Inference threads")
+    parser.add_argument('--imgsz', type=int, default=640, help="Model input size")
+    parser.add_argument('--no-display', action='store_true', help="Do not open a window per stream")
+    parser.add_argument('--report-every', type=float, default=5.0, help="Seconds between FPS reports")
+    args = parser.parse_args()
+
+    model = load_model(args.model, backend=args.backend, threads=args.threads, imgsz=args.imgsz)
+    sources = [int(source) if source.isdigit() else source for source in args.sources]
+    last_report = [time.perf_counter()]
+
+    def show_result(stream_id, frame, result):
+        if not args.no_display:
+            annotated_frame = result.plot()
+            cv2.putText(annotated_frame, f"FPS: {engine.streams[stream_id].fps():.1f}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            cv2.imshow(f"Camera {stream_id}", annotated_frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                engine.stop_event.set()
+
+        now = time.perf_counter()
+        if now - last_report[0] >= args.report_every:
+            last_report[0] = now
+            print(" | ".join(f"camera {sid}: {fps:.1f} FPS" for sid, fps in engine.fps().items()))
+
+    engine = MultiCameraEngine(model, sources, on_result=show_result)
+    engine.start().run()
+    cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+
+from metrics import metrics
+
+# Network streams and camera indices are live sources; anything else is a file
+LIVE_PREFIXES = ('rtsp://', 'rtsps://', 'rtmp://', 'http://', 'https://', 'udp://', 'tcp://')
+
+# Marks the end of the stream as it travels through the queues
+END_OF_STREAM = object()
+
+
+def is_live_source(video_source):
+    if isinstance(video_source, int):
+        return True
+    source = str(video_source)
+    return source.isdigit() or source.lower().startswith(LIVE_PREFIXES)
+
+
+def put_latest(q, item):
+    # Drop the oldest queued item instead of blocking, so live sources stay real-time.
+    # Returns how many queued items were dropped.
+    dropped = 0
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                q.get_nowait()
+                dropped += 1
+            except queue.Empty:
+                pass
+
+
+class FramePipeline:
+    # Decoder thread -> inference worker -> UI consumer, joined by bounded queues.
+    # The decoder and the worker overlap, so throughput is max(decode, infer)
+    # instead of their sum, and the UI only ever pulls finished frames.
+    # decode_thread=False reads the capture on the worker itself, for captures that
+    # already decode in another process (shm_transport.ShmCapture) or keep only the
+    # newest frame on their own thread (capture.LiveCapture), so the worker always
+    # gets the freshest frame instead of the oldest of a queue.
+
+    def __init__(self, cap, process_frame, live=False, queue_size=4, name='default', on_latency=None,
+                 decode_thread=True):
+        self.cap = cap
+        self.name = name  # Stream label for the metrics
+        self.process_frame = process_frame  # Runs on the inference worker
+        # Optional callback(latency, process_seconds) per finished frame; latency runs from
+        # decode for live sources and from leaving the queue for files
+        self.on_latency = on_latency
+        self.live = live
+        self.decode_thread = decode_thread
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.finished = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.done = False
+        self.error = None
+        self.decoder_thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self.infer_thread = threading.Thread(target=self._infer_loop, daemon=True)
+
+    def start(self):
+        if self.decode_thread:
+            self.decoder_thread.start()
+        self.infer_thread.start()
+        return self
+
+    def _put(self, q, item):
+        if self.live:
+            dropped = put_latest(q, item)
+            if dropped:
+                metrics.inc('shoplift_dropped_frames_total', dropped, stream=self.name)
+            return
+        # Files are never dropped: wait for room, but give up once stopped
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return END_OF_STREAM
+
+    def _decode_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                with metrics.timer('decode', self.name):
+                    ret, frame = self.cap.read()
+                if not ret:
+                    break
+                self._put(self.decoded, (time.monotonic(), frame))
+                metrics.set('shoplift_queue_backlog', self.decoded.qsize(), stream=self.name, queue='decoded')
+        finally:
+            # The decoder thread owns the capture, so it is released here
+            self.cap.release()
+            self._put(self.decoded, END_OF_STREAM)
+
+    def _next_decoded(self):
+        # (decode time, frame) from the decoder thread, or read right here when no decoder thread runs
+        if self.decode_thread:
+            return self._get(self.decoded)
+        ret, frame = self.cap.read()
+        if not ret:
+            return END_OF_STREAM
+        return getattr(self.cap, 'frame_time', None) or time.monotonic(), frame
+
+    def _infer_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                item = self._next_decoded()
+                if item is END_OF_STREAM:
+                    break
+                decoded_at, frame = item
+                start = time.monotonic()
+                if not self.live:
+                    # A file's decoder runs ahead into the queue on purpose; time spent
+                    # waiting there is not lag, so latency is counted from the dequeue
+                    decoded_at = start
+                with metrics.timer('process', self.name):
+                    output = self.process_frame(frame)
+                self._put(self.finished, output)
+                if self.on_latency is not None:
+                    now = time.monotonic()
+                    self.on_latency(now - decoded_at, now - start)
+                metrics.set('shoplift_queue_backlog', self.finished.qsize(), stream=self.name, queue='finished')
+                metrics.frame_done(self.name)
+        except Exception as exc:  # Surface worker failures to the UI thread
+            self.error = exc
+        finally:
+            if not self.decode_thread:
+                self.cap.release()  # Owned by the worker in this mode
+            self._put(self.finished, END_OF_STREAM)
+
+    def get_latest(self):
+        # Non-blocking: drains the finished queue and returns only the newest frame (or None),
+        # so a display refreshing slower than inference skips frames instead of holding it back
+        latest = None
+        skipped = 0
+        while not self.done:
+            try:
+                item = self.finished.get_nowait()
+            except queue.Empty:
+                break
+            if item is END_OF_STREAM:
+                self.done = True
+                self.stop()
+                break
+            if latest is not None:
+                skipped += 1
+            latest = item
+        if skipped:
+            metrics.inc('shoplift_display_skipped_frames_total', skipped, stream=self.name)
+        return latest
+
+    def stop(self):
+        self.stop_event.set()
+        # A read() blocked on a stalled live stream never sees stop_event; captures that
+        # allow it are released here to wake it. cv2.VideoCapture is left to its reading
+        # thread, which releases it on the way out.
+        if getattr(self.cap, 'release_wakes_reader', False):
+            self.cap.release()
+        for thread in (self.decoder_thread, self.infer_thread):
+            if thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=1.0)
@@ -0,0 +1,84 @@
+import cv2
+import numpy as np
+
+# Colors (BGR) used when no explicit color is given, picked by class ID
+PALETTE = [(0, 255, 0), (0, 0, 255), (255, 128, 0), (0, 255, 255), (255, 0, 255), (255, 255, 0)]
+
+
+class Detections:
+    # The boxes of one frame as parallel NumPy arrays
+
+    def __init__(self, xyxy, confidence, class_id, track_id=None):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float32).reshape(-1)
+        self.class_id = np.asarray(class_id, dtype=np.int64).reshape(-1)
+        self.track_id = None if track_id is None else np.asarray(track_id, dtype=np.int64).reshape(-1)
+
+    def __len__(self):
+        return len(self.confidence)
+
+    def select(self, mask):
+        track_id = None if self.track_id is None else self.track_id[mask]
+        return Detections(self.xyxy[mask], self.confidence[mask], self.class_id[mask], track_id)
+
+    def scaled(self, scale_x, scale_y):
+        # Same boxes in another resolution, e.g. the display size
+        xyxy = self.xyxy * np.array([scale_x, scale_y, scale_x, scale_y], dtype=np.float32)
+        return Detections(xyxy, self.confidence, self.class_id, self.track_id)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+    @classmethod
+    def from_tracks(cls, tracks):
+        if not tracks:
+            return cls.empty()
+        return cls([track.box for track in tracks], [track.score() for track in tracks],
+                   [track.class_id for track in tracks], [track.track_id for track in tracks])
+
+
+def class_ids_for(names, wanted_names):
+    # Class IDs of a model's names dict that match the given class names
+    return [class_id for class_id, class_name in names.items() if class_name in wanted_names]
+
+
+def extract_detections(result, class_ids=None, min_confidence=0.0):
+    # One bulk device-to-host copy per frame, then class/confidence filtering with masks.
+    # boxes.data rows are x1, y1, x2, y2, [track_id,] confidence, class
+    data = result.boxes.data.cpu().numpy()
+    if len(data) == 0:
+        return Detections.empty()
+    keep = data[:, -2] > min_confidence
+    if class_ids is not None:
+        keep &= np.isin(data[:, -1], class_ids)
+    data = data[keep]
+    return Detections(data[:, :4], data[:, -2], data[:, -1])
+
+
+def shoplifting_detection_logic(detections):
+    # Example condition: if more than one person is detected
+    return len(detections) > 1  # Return True if shoplifting is detected
+
+
+def annotate(frame, detections, names, color=None, thickness=2, font_scale=0.5, text_thickness=2, status=None):
+    # Draws boxes and labels in place; color=None picks a color per class.
+    # status is an optional (text, color) banner for the frame-level decision.
+    corners = np.rint(detections.xyxy).astype(np.int32).tolist()
+    confidences = detections.confidence.tolist()
+    class_ids = detections.class_id.tolist()
+    track_ids = None if detections.track_id is None else detections.track_id.tolist()
+    for i, (x1, y1, x2, y2) in enumerate(corners):
+        box_color = color if color is not None else PALETTE[class_ids[i] % len(PALETTE)]
+        class_name = names.get(class_ids[i], str(class_ids[i]))
+        if track_ids is not None:
+            label = f"{class_name} #{track_ids[i]}: {confidences[i]:.2f}"
+        else:
+            label = f"{class_name}: {confidences[i]:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), box_color, thickness)
+        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, font_scale, box_color, text_thickness)
+
+    if status is not None:
+        text, status_color = status
+        cv2.putText(frame, text, (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, status_color, 2)
+    return frame
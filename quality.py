@@ -0,0 +1,94 @@
+import collections
+import statistics
+
+from metrics import metrics
+
+
+class QualityController:
+    # Holds a stream at target_fps and within latency_budget by trading quality for
+    # speed, one step at a time and only within the configured bounds. Overloaded,
+    # it first runs the detector on fewer frames, then shrinks the model input, and
+    # only then lowers the display rate, whose cost is not part of the measured
+    # latency; with enough headroom it undoes the steps in reverse.
+    # Every change is followed by settle_frames of fresh measurements before the next.
+
+    def __init__(self, target_fps=10.0, latency_budget=0.3, imgsz_choices=(320, 416, 512, 640), imgsz=None,
+                 stride=1, stride_bounds=(1, 6), display_fps=30, display_fps_bounds=(10, 30), display_fps_step=5,
+                 window=30, settle_frames=30, headroom=0.6, name='default'):
+        self.target_fps = target_fps
+        self.latency_budget = latency_budget
+        self.imgsz_choices = sorted(imgsz_choices)
+        self.imgsz = imgsz if imgsz in self.imgsz_choices else self.imgsz_choices[-1]
+        self.stride_bounds = stride_bounds
+        self.stride = min(max(stride, stride_bounds[0]), stride_bounds[1])
+        self.display_fps_bounds = display_fps_bounds
+        self.display_fps = min(max(display_fps, display_fps_bounds[0]), display_fps_bounds[1])
+        self.display_fps_step = display_fps_step
+        self.settle_frames = settle_frames
+        self.headroom = headroom
+        self.name = str(name)
+        self.latencies = collections.deque(maxlen=window)
+        self.process_times = collections.deque(maxlen=window)
+        self.frames_since_change = 0
+        self._report()
+
+    def record(self, latency, process_seconds):
+        # Called once per finished frame with its end-to-end latency (decode to result)
+        # and the time spent processing it
+        self.latencies.append(latency)
+        self.process_times.append(process_seconds)
+        self.frames_since_change += 1
+        if self.frames_since_change < self.settle_frames or len(self.latencies) < self.latencies.maxlen:
+            return
+
+        latency = statistics.median(self.latencies)
+        frame_budget = 1.0 / self.target_fps
+        process = statistics.fmean(self.process_times)
+        if latency > self.latency_budget or process > frame_budget:
+            changed = self._degrade()
+        elif latency < self.headroom * self.latency_budget and process < self.headroom * frame_budget:
+            changed = self._improve()
+        else:
+            changed = False
+        if changed:
+            self.frames_since_change = 0
+            self.latencies.clear()
+            self.process_times.clear()
+            self._report()
+            print(f"{self.name}: {self.describe()} (latency {latency * 1000:.0f} ms, {process * 1000:.0f} ms/frame)")
+
+    def _degrade(self):
+        if self.stride < self.stride_bounds[1]:
+            self.stride += 1
+        elif self.imgsz != self.imgsz_choices[0]:
+            self.imgsz = self.imgsz_choices[self.imgsz_choices.index(self.imgsz) - 1]
+        elif self.display_fps > self.display_fps_bounds[0]:
+            self.display_fps = max(self.display_fps_bounds[0], self.display_fps - self.display_fps_step)
+        else:
+            return False  # Already at the lowest quality allowed
+        return True
+
+    def _improve(self):
+        if self.display_fps < self.display_fps_bounds[1]:
+            self.display_fps = min(self.display_fps_bounds[1], self.display_fps + self.display_fps_step)
+        elif self.imgsz != self.imgsz_choices[-1]:
+            self.imgsz = self.imgsz_choices[self.imgsz_choices.index(self.imgsz) + 1]
+        elif self.stride > self.stride_bounds[0]:
+            self.stride -= 1
+        else:
+            return False
+        return True
+
+    def display_interval_ms(self):
+        return max(1, int(1000 / self.display_fps))
+
+    def settings(self):
+        return {'imgsz': self.imgsz, 'stride': self.stride, 'display_fps': self.display_fps}
+
+    def describe(self):
+        return f"{self.imgsz}px  detect every {self.stride}  display {self.display_fps} fps"
+
+    def _report(self):
+        metrics.set('shoplift_quality_imgsz', self.imgsz, stream=self.name)
+        metrics.set('shoplift_quality_stride', self.stride, stream=self.name)
+        metrics.set('shoplift_quality_display_fps', self.display_fps, stream=self.name)
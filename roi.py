@@ -0,0 +1,128 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+from postprocess import Detections, extract_detections
+from tracker import iou_matrix
+
+# Per-camera regions of interest live here; without this file the whole frame is used
+ROI_CONFIG_PATH = 'roi.json'
+
+
+def to_polygon(region):
+    # A region is either a rectangle [x1, y1, x2, y2] or a polygon [[x, y], ...] in frame pixels
+    if len(region) == 4 and all(isinstance(value, (int, float)) for value in region):
+        x1, y1, x2, y2 = region
+        region = [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+    return np.asarray(region, dtype=np.int32).reshape(-1, 2)
+
+
+def tile_starts(length, tile_size, overlap):
+    # Start offsets of overlapping tiles covering [0, length)
+    if length <= tile_size:
+        return [0]
+    step = max(1, int(tile_size * (1.0 - overlap)))
+    starts = list(range(0, length - tile_size, step))
+    starts.append(length - tile_size)
+    return starts
+
+
+def non_max_suppression(detections, iou_threshold):
+    # Class-aware greedy NMS, for boxes found twice in overlapping crops
+    if len(detections) < 2:
+        return detections
+    order = np.argsort(-detections.confidence)
+    ious = iou_matrix(detections.xyxy[order], detections.xyxy[order])
+    same_class = detections.class_id[order][:, None] == detections.class_id[order][None, :]
+    suppressed = np.zeros(len(order), dtype=bool)
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        suppressed[i + 1:] |= (ious[i, i + 1:] > iou_threshold) & same_class[i, i + 1:]
+    return detections.select(np.sort(order[~suppressed]))
+
+
+class RegionInference:
+    # Runs the model only on the regions of interest of a camera: each region's
+    # bounding rectangle is cropped (and optionally tiled so small, distant shelves
+    # keep full resolution), all crops go through one batched model call, and the
+    # boxes are mapped back to full-frame coordinates and kept if their centre
+    # lies inside a region.
+
+    def __init__(self, regions, tile_size=None, tile_overlap=0.2, iou_threshold=0.5):
+        self.polygons = [to_polygon(region) for region in regions]
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.iou_threshold = iou_threshold
+        self.frame_shape = None
+        self.mask = None
+        self.windows = None
+
+    def _prepare(self, frame_shape):
+        # Region mask and crop windows only change with the frame size
+        height, width = frame_shape[:2]
+        self.mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(self.mask, self.polygons, 1)
+        self.windows = []
+        for polygon in self.polygons:
+            x, y, w, h = cv2.boundingRect(polygon)
+            x1, y1 = max(0, x), max(0, y)
+            x2, y2 = min(width, x + w), min(height, y + h)
+            if x2 <= x1 or y2 <= y1:
+                continue
+            if self.tile_size is None:
+                self.windows.append((x1, y1, x2, y2))
+                continue
+            for ty in tile_starts(y2 - y1, self.tile_size, self.tile_overlap):
+                for tx in tile_starts(x2 - x1, self.tile_size, self.tile_overlap):
+                    self.windows.append((x1 + tx, y1 + ty, min(x2, x1 + tx + self.tile_size),
+                                         min(y2, y1 + ty + self.tile_size)))
+        self.frame_shape = frame_shape
+
+    def detect(self, model, frame, class_ids=None, min_confidence=0.0, **model_kwargs):
+        if self.frame_shape != frame.shape:
+            self._prepare(frame.shape)
+        if not self.windows:
+            return Detections.empty()
+
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self.windows]
+        results = model(crops, verbose=False, **model_kwargs)
+        found = []
+        for (x1, y1, _, _), result in zip(self.windows, results):
+            detections = extract_detections(result, class_ids=class_ids, min_confidence=min_confidence)
+            if len(detections):
+                detections.xyxy += np.array([x1, y1, x1, y1], dtype=np.float32)
+                found.append(detections)
+        if not found:
+            return Detections.empty()
+
+        detections = Detections(np.concatenate([d.xyxy for d in found]), np.concatenate([d.confidence for d in found]),
+                                np.concatenate([d.class_id for d in found]))
+        # Keep boxes whose centre falls inside a region
+        height, width = self.mask.shape
+        centre_x = np.clip(((detections.xyxy[:, 0] + detections.xyxy[:, 2]) / 2).astype(np.int32), 0, width - 1)
+        centre_y = np.clip(((detections.xyxy[:, 1] + detections.xyxy[:, 3]) / 2).astype(np.int32), 0, height - 1)
+        detections = detections.select(self.mask[centre_y, centre_x] > 0)
+        return non_max_suppression(detections, self.iou_threshold)
+
+
+def load_roi_settings(config_path=ROI_CONFIG_PATH):
+    # {"sources": {"rtsp://cam3/stream": {"regions": [[x1, y1, x2, y2], [[x, y], ...]], "tile_size": 640}}}
+    if not os.path.exists(config_path):
+        return None
+    with open(config_path) as f:
+        return json.load(f)
+
+
+def region_inference_for(video_source, roi_settings):
+    # Builds the region inference for one camera, or None to use the whole frame
+    if roi_settings is None:
+        return None
+    source_settings = roi_settings.get('sources', {}).get(str(video_source))
+    if not source_settings or not source_settings.get('regions'):
+        return None
+    return RegionInference(source_settings['regions'], tile_size=source_settings.get('tile_size'),
+                           tile_overlap=source_settings.get('tile_overlap', 0.2),
+                           iou_threshold=source_settings.get('iou_threshold', 0.5))
@@ -0,0 +1,222 @@
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from capture import open_capture
+from metrics import metrics
+from pipeline import is_live_source
+from video_writer import segment_prefix
+
+# Header fields at the start of the block: newest published sequence number, last
+# sequence number taken by the reader, slot the reader is using (-1 for none), end of stream
+LATEST, CONSUMED, READER_SLOT, CLOSED = range(4)
+HEADER_FIELDS = 4
+
+# Slot sequence number while the writer is filling it
+WRITING = -1
+
+
+class FrameRing:
+    # A ring of fixed-shape frame slots in one shared-memory block, written by a
+    # decoder process and read by the inference process as NumPy views, so a
+    # frame is copied once (into its slot) instead of being pickled across.
+    # Every slot carries the sequence number of the frame in it; a small lock
+    # guards only this bookkeeping, never the frame copies. The writer never
+    # touches the slot the reader is using; block=True writers also wait rather
+    # than overwrite frames the reader has not taken yet.
+
+    def __init__(self, shape, slots=4, name=None, lock=None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.lock = lock
+        frame_bytes = int(np.prod(self.shape))
+        header_bytes = 8 * (HEADER_FIELDS + 2 * slots)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * frame_bytes)
+        else:
+            # The decoder unlinks the block (which also clears it from the resource tracker
+            # both processes share), so attaching must not unregister it here
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        self.slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf, offset=8 * HEADER_FIELDS)
+        self.slot_time = np.ndarray((slots,), dtype=np.float64, buffer=self.shm.buf, offset=8 * (HEADER_FIELDS + slots))
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=header_bytes)
+        if name is None:
+            self.header[:] = (0, 0, -1, 0)
+            self.slot_seq[:] = 0  # Sequence numbers start at 1, so 0 is an empty slot
+
+    def write(self, frame, block=False, stop_event=None):
+        # Copies one frame into a free slot and publishes it. Returns False if stopped while waiting.
+        while True:
+            with self.lock:
+                if not block or self.header[LATEST] - self.header[CONSUMED] < self.slots - 1:
+                    # The oldest slot the reader is not using
+                    slot = min((i for i in range(self.slots) if i != self.header[READER_SLOT]),
+                               key=lambda i: self.slot_seq[i])
+                    self.slot_seq[slot] = WRITING
+                    break
+            if stop_event is not None and stop_event.wait(0.005):
+                return False
+
+        target = self.frames[slot]
+        if frame.shape == self.shape:
+            np.copyto(target, frame)
+        else:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=target)  # e.g. after a reconnect
+
+        with self.lock:
+            sequence = self.header[LATEST] + 1
+            self.slot_seq[slot] = sequence
+            self.slot_time[slot] = time.monotonic()
+            self.header[LATEST] = sequence
+        return True
+
+    def acquire(self, in_order=False):
+        # Releases the reader's previous slot and takes the next frame (in_order) or the
+        # newest one. Returns (sequence, read-only view, monotonic write time, frames
+        # skipped) or None if there is nothing new. The view stays valid until the next call.
+        with self.lock:
+            self.header[READER_SLOT] = -1
+            latest, consumed = int(self.header[LATEST]), int(self.header[CONSUMED])
+            if latest <= consumed:
+                return None
+            wanted = consumed + 1 if in_order else latest
+            slot = int(np.flatnonzero(self.slot_seq == wanted)[0])
+            self.header[READER_SLOT] = slot
+            self.header[CONSUMED] = wanted
+            written_at = float(self.slot_time[slot])
+        view = self.frames[slot]
+        view.flags.writeable = False
+        return wanted, view, written_at, wanted - consumed - 1
+
+    def release_slot(self):
+        with self.lock:
+            self.header[READER_SLOT] = -1
+
+    def close_stream(self):
+        with self.lock:
+            self.header[CLOSED] = 1
+
+    def stream_closed(self):
+        return bool(self.header[CLOSED])
+
+    def close(self, unlink=False):
+        self.header = self.slot_seq = self.slot_time = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # A caller still holds a frame view; the mapping goes away with it
+        if unlink:
+            self.shm.unlink()
+
+
+def decode_process(video_source, slots, live, lock, handshake, new_frame, stop_event):
+    # Decoder process: reads the source and publishes frames into a ring it creates,
+    # sized from the first frame. The ring's name and shape go back through handshake.
+    cap = open_capture(video_source)
+    ret, frame = cap.read() if cap.isOpened() else (False, None)
+    if not ret:
+        cap.release()
+        handshake.put(None)
+        return
+    ring = FrameRing(frame.shape, slots, lock=lock)
+    handshake.put((ring.name, frame.shape, cap.get(cv2.CAP_PROP_FPS)))
+    try:
+        while not stop_event.is_set():
+            if not ring.write(frame, block=not live, stop_event=stop_event):
+                break
+            new_frame.set()
+            ret, frame = cap.read()
+            if not ret:
+                break
+    finally:
+        cap.release()
+        ring.close_stream()
+        new_frame.set()
+        # Unlinking only removes the name; the reader's mapping stays valid until it closes
+        ring.close(unlink=True)
+
+
+class ShmCapture:
+    # cv2.VideoCapture-like reader whose frames are decoded in a separate process and
+    # arrive through a FrameRing, so decoding and inference run on different cores
+    # without sharing a GIL. read() returns a read-only view into shared memory that
+    # stays valid until the next read(), so it must be consumed by the thread that
+    # calls read() (FramePipeline with decode_thread=False).
+
+    # release() may be called from any thread and makes a blocked read() return (False, None)
+    release_wakes_reader = True
+
+    def __init__(self, video_source, slots=4, live=None, open_timeout=30.0):
+        self.live = is_live_source(video_source) if live is None else live
+        self.name = segment_prefix(video_source)
+        self.frame_time = None  # time.monotonic() at which the last read frame was decoded
+        self.dropped = 0
+        # spawn: a fresh interpreter, never a fork of a process running Tk and model threads
+        context = multiprocessing.get_context('spawn')
+        self.lock = context.Lock()
+        self.new_frame = context.Event()
+        self.stop_event = context.Event()
+        self.read_lock = threading.Lock()  # Keeps release() from closing the ring under a read()
+        handshake = context.Queue()
+        self.process = context.Process(target=decode_process, daemon=True,
+                                       args=(video_source, slots, self.live, self.lock, handshake,
+                                             self.new_frame, self.stop_event))
+        self.process.start()
+        self.ring = None
+        self.fps = 0.0
+        try:
+            info = handshake.get(timeout=open_timeout)
+        except Exception:
+            info = None
+        if info is not None:
+            ring_name, shape, self.fps = info
+            self.ring = FrameRing(shape, slots, name=ring_name, lock=self.lock)
+
+    def isOpened(self):
+        return self.ring is not None
+
+    def read(self):
+        with self.read_lock:
+            if self.ring is None:
+                return False, None
+            while True:
+                self.new_frame.clear()
+                item = self.ring.acquire(in_order=not self.live)
+                if item is not None:
+                    _, frame, self.frame_time, skipped = item
+                    if skipped:
+                        self.dropped += skipped
+                        metrics.inc('shoplift_dropped_frames_total', skipped, stream=self.name)
+                    return True, frame
+                if self.ring.stream_closed() or not self.process.is_alive() or self.stop_event.is_set():
+                    return False, None
+                self.new_frame.wait(0.1)
+
+    def get(self, prop):
+        if self.ring is None:
+            return 0.0
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.ring.shape[1])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.ring.shape[0])
+        return 0.0
+
+    def release(self):
+        self.stop_event.set()
+        self.new_frame.set()  # Wakes a read() waiting on another thread
+        self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        with self.read_lock:
+            if self.ring is not None:
+                self.ring.release_slot()
+                self.ring.close()
+                self.ring = None
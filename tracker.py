@@ -0,0 +1,135 @@
+import collections
+import itertools
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    # Pairwise IoU between (N, 4) and (M, 4) xyxy boxes
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    # One object followed across frames. Between detector runs the box is moved
+    # with a smoothed constant-velocity estimate.
+
+    def __init__(self, track_id, box, confidence, class_id, evidence_window):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.detected_box = self.box
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.confidence = float(confidence)
+        self.class_id = int(class_id)
+        self.misses = 0
+        self.frames_since_detection = 0
+        # Confidence per detector run (0 when missed), used for temporal decisions
+        self.evidence = collections.deque([float(confidence)], maxlen=evidence_window)
+
+    def predict(self):
+        self.box = self.box + self.velocity
+        self.frames_since_detection += 1
+
+    def hold(self):
+        # Static scene: the box stays where it was last seen
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.frames_since_detection += 1
+
+    def update(self, box, confidence, class_id, smoothing):
+        box = np.asarray(box, dtype=np.float32)
+        # Per-frame motion since the last detection, blended with the previous estimate
+        measured = (box - self.detected_box) / max(1, self.frames_since_detection)
+        self.velocity = smoothing * self.velocity + (1.0 - smoothing) * measured
+        self.box = box
+        self.detected_box = box
+        self.confidence = float(confidence)
+        self.class_id = int(class_id)
+        self.misses = 0
+        self.frames_since_detection = 0
+        self.evidence.append(float(confidence))
+
+    def mark_missed(self):
+        self.misses += 1
+        self.evidence.append(0.0)
+        self.velocity *= 0.5  # Slow down boxes the detector no longer sees
+
+    def hits(self):
+        return sum(1 for score in self.evidence if score > 0)
+
+    def score(self):
+        # Mean confidence over the evidence window; misses count as zero
+        return sum(self.evidence) / len(self.evidence)
+
+    def is_confirmed(self, min_hits):
+        return self.hits() >= min_hits
+
+
+class IoUTracker:
+    # Greedy IoU multi-object tracker giving detections stable IDs. update() is
+    # called on frames where the detector ran, predict() on the frames in between,
+    # and hold() instead while a motion gate reports a static scene.
+
+    def __init__(self, iou_threshold=0.3, max_misses=5, evidence_window=10, min_hits=3, smoothing=0.5):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.evidence_window = evidence_window
+        self.min_hits = min_hits
+        self.smoothing = smoothing
+        self.tracks = []
+        self.next_id = itertools.count(1)
+        self.detection_track_ids = np.zeros(0, dtype=np.int64)  # Track of every box in the last update(), in input order
+
+    def predict(self):
+        for track in self.tracks:
+            track.predict()
+        return self.tracks
+
+    def hold(self):
+        for track in self.tracks:
+            track.hold()
+        return self.tracks
+
+    def update(self, boxes, confidences, class_ids):
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        for track in self.tracks:
+            track.predict()
+
+        unmatched_tracks = set(range(len(self.tracks)))
+        unmatched_detections = set(range(len(boxes)))
+        self.detection_track_ids = np.zeros(len(boxes), dtype=np.int64)
+        if self.tracks and len(boxes):
+            ious = iou_matrix([track.box for track in self.tracks], boxes)
+            # Greedy assignment, best overlaps first
+            for flat_index in np.argsort(-ious, axis=None):
+                track_index, detection_index = np.unravel_index(flat_index, ious.shape)
+                if ious[track_index, detection_index] < self.iou_threshold:
+                    break
+                if track_index in unmatched_tracks and detection_index in unmatched_detections:
+                    self.tracks[track_index].update(boxes[detection_index], confidences[detection_index],
+                                                    class_ids[detection_index], self.smoothing)
+                    self.detection_track_ids[detection_index] = self.tracks[track_index].track_id
+                    unmatched_tracks.discard(track_index)
+                    unmatched_detections.discard(detection_index)
+
+        for track_index in unmatched_tracks:
+            self.tracks[track_index].mark_missed()
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for detection_index in sorted(unmatched_detections):
+            self.tracks.append(Track(next(self.next_id), boxes[detection_index], confidences[detection_index],
+                                     class_ids[detection_index], self.evidence_window))
+            self.detection_track_ids[detection_index] = self.tracks[-1].track_id
+        return self.tracks
+
+    def confirmed_tracks(self):
+        # Tracks seen on enough recent detector runs; a single missed run does not drop them
+        return [track for track in self.tracks if track.is_confirmed(self.min_hits)]
@@ -0,0 +1,111 @@
+import csv
+import os
+import queue
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import cv2
+
+# Marks the end of the writer queue
+CLOSE = object()
+
+
+def segment_prefix(video_source):
+    # File-system friendly name for a video file, stream URL or camera index. URLs keep
+    # host, port and path (rtsp://cam3/Streaming/Channels/101 -> cam3_Streaming_Channels_101),
+    # never the credentials; only file paths lose their directory and extension.
+    source = str(video_source)
+    if '://' in source:
+        url = urlsplit(source)
+        host = url.hostname or ''
+        if url.port is not None:
+            host += f':{url.port}'
+        name = host + url.path + (f'?{url.query}' if url.query else '')
+    else:
+        name = os.path.splitext(os.path.basename(source.rstrip('/')))[0] or source
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or 'stream'
+
+
+class SegmentedVideoWriter:
+    # Encodes annotated frames into rotating cv2.VideoWriter segments on a
+    # background thread, so the detection loop never waits on encoding or disk.
+    # A sidecar CSV index maps every written frame number to its segment and offset.
+
+    def __init__(self, output_dir, prefix='segment', fps=25.0, segment_frames=9000, fourcc='mp4v',
+                 queue_size=64, detections_only=False, block=True):
+        self.output_dir = output_dir
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.segment_frames = segment_frames
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.detections_only = detections_only
+        self.block = block
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self.error = None
+
+        os.makedirs(output_dir, exist_ok=True)
+        # The session timestamp keeps later runs from overwriting earlier output
+        self.session = f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.index_path = os.path.join(output_dir, f"{self.session}_index.csv")
+        self.writer = None
+        self.segment_index = -1
+        self.segment_path = None
+        self.segment_offset = 0
+        self.frame_size = None
+
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def write(self, frame, frame_number, has_detections=True):
+        if self.detections_only and not has_detections:
+            return
+        if self.block:
+            self.frames.put((frame_number, frame))
+            return
+        try:
+            self.frames.put_nowait((frame_number, frame))
+        except queue.Full:
+            self.dropped += 1
+
+    def _open_segment(self, frame_size):
+        if self.writer is not None:
+            self.writer.release()
+        self.segment_index += 1
+        self.segment_path = os.path.join(self.output_dir, f"{self.session}_{self.segment_index:04d}.mp4")
+        self.writer = cv2.VideoWriter(self.segment_path, self.fourcc, self.fps, frame_size)
+        self.segment_offset = 0
+        self.frame_size = frame_size
+
+    def _write_loop(self):
+        with open(self.index_path, 'w', newline='') as index_file:
+            index = csv.writer(index_file)
+            index.writerow(['frame', 'segment', 'offset'])
+            while True:
+                item = self.frames.get()
+                if item is CLOSE:
+                    break
+                if self.error is not None:
+                    continue  # Keep draining so producers never block on a dead writer
+                frame_number, frame = item
+                try:
+                    frame_size = (frame.shape[1], frame.shape[0])
+                    if (self.writer is None or self.segment_offset >= self.segment_frames
+                            or frame_size != self.frame_size):
+                        self._open_segment(frame_size)
+                    self.writer.write(frame)
+                    index.writerow([frame_number, os.path.basename(self.segment_path), self.segment_offset])
+                    self.segment_offset += 1
+                    self.written += 1
+                except Exception as exc:
+                    self.error = exc
+        if self.writer is not None:
+            self.writer.release()
+
+    def close(self):
+        self.frames.put(CLOSE)
+        self.thread.join()
+        if self.error is not None:
+            print(f"Video writer failed: {self.error}")